@@ -34,6 +34,15 @@ public:
      */
     std::vector<uint8_t> decrypt(const std::vector<uint8_t>& ciphertext);
 
+    /**
+     * @brief ECB模式按指针加解密，in与out可以是同一块内存
+     * @param in 输入数据
+     * @param out 输出缓冲区，至少len字节
+     * @param len 数据长度(需为16的倍数)
+     * @param isEncrypt true为加密，false为解密
+     */
+    void cryptBlocks(const uint8_t* in, uint8_t* out, size_t len, bool isEncrypt);
+
 private:
     uint32_t rk[32]; // 轮密钥
 
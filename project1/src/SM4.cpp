@@ -71,14 +71,17 @@ std::vector<uint8_t> SM4::crypt(const std::vector<uint8_t>& input, bool isEncryp
         throw std::invalid_argument("SM4 input length must be multiple of 16 bytes");
     }
 
-    std::vector<uint8_t> output;
-    output.reserve(input.size());
+    std::vector<uint8_t> output(input.size());
+    cryptBlocks(input.data(), output.data(), input.size(), isEncrypt);
+    return output;
+}
 
-    for (size_t i = 0; i < input.size(); i += 16) {
+void SM4::cryptBlocks(const uint8_t* in, uint8_t* out, size_t len, bool isEncrypt) {
+    for (size_t i = 0; i < len; i += 16) {
         uint32_t X[4];
         for (int j = 0; j < 4; j++) {
-            X[j] = (input[i+4*j]<<24) | (input[i+4*j+1]<<16) | 
-                   (input[i+4*j+2]<<8) | input[i+4*j+3];
+            X[j] = (in[i+4*j]<<24) | (in[i+4*j+1]<<16) | 
+                   (in[i+4*j+2]<<8) | in[i+4*j+3];
         }
 
         for (int j = 0; j < 32; j++) {
@@ -90,17 +93,17 @@ std::vector<uint8_t> SM4::crypt(const std::vector<uint8_t>& input, bool isEncryp
             X[3] = X_next;
         }
 
+        // 整个分组读入X后才写出，支持原地加解密
         uint32_t Y[4] = {X[3], X[2], X[1], X[0]};
         for (int j = 0; j < 4; j++) {
-            output.push_back((Y[j] >> 24) & 0xFF);
-            output.push_back((Y[j] >> 16) & 0xFF);
-            output.push_back((Y[j] >> 8) & 0xFF);
-            output.push_back(Y[j] & 0xFF);
+            out[i+4*j]   = (Y[j] >> 24) & 0xFF;
+            out[i+4*j+1] = (Y[j] >> 16) & 0xFF;
+            out[i+4*j+2] = (Y[j] >> 8) & 0xFF;
+            out[i+4*j+3] = Y[j] & 0xFF;
         }
     }
-
-    return output;
 }
+
 std::vector<uint8_t> SM4::encrypt(const std::vector<uint8_t>& plaintext) {
     return crypt(plaintext, true);
 }
@@ -110,7 +113,7 @@ std::vector<uint8_t> SM4::decrypt(const std::vector<uint8_t>& ciphertext) {
 }
 // 线性变换函数 F
 uint32_t SM4::F(uint32_t X0, uint32_t X1, uint32_t X2, uint32_t X3, uint32_t rk) {
-    return X0 ^ L(X1 ^ X2 ^ X3 ^ rk);
+    return X0 ^ T(X1 ^ X2 ^ X3 ^ rk);
 }
 
 // 密钥扩展专用变换 T'
@@ -1,7 +1,16 @@
 import cv2
+import hashlib
 import numpy as np
-from collections import Counter
 import random
+import threading
+from collections import OrderedDict
+from attacks import adjust_contrast_image as adjust_contrast, crop_image, flip_image, translate_image  # 原接口
+
+__all__ = ["DELTA", "STRIP_ROWS", "LEGACY_ORDER_LIMIT", "FeistelPermutation", "DCTWatermarkContext",
+           "block_dct", "block_idct", "dct_matrix", "block_view", "block_order", "gather_blocks", "scatter_blocks",
+           "text_to_bits", "bits_to_text", "embed_bits", "extract_bits", "embed_bits_tiled", "extract_bits_tiled",
+           "read_frames", "embed_dct_watermark_robust", "extract_dct_watermark_robust",
+           "flip_image", "translate_image", "crop_image", "adjust_contrast"]
 
 def block_dct(block):
     return cv2.dct(np.float32(block))
@@ -9,120 +18,411 @@ def block_dct(block):
 def block_idct(dct_block):
     return cv2.idct(dct_block)
 
-def embed_dct_watermark_robust(image_path, watermark_text, output_path, block_size=8, redundancy=3):
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    h, w = img.shape
 
-    watermark_bin = ''.join(format(ord(c), '08b') for c in watermark_text)
-    total_bits = len(watermark_bin)
+# ---------------- 批量分块 DCT 引擎 ----------------
+# 正交 DCT-II 矩阵 D 满足 C = D @ B @ D.T、B = D.T @ C @ D，与 cv2.dct 一致。
+# 只改一个系数 C[u, v] += d 时，像素域的变化为 d * outer(D[u], D[v])，
+# 因此嵌入和提取都不需要完整的正反变换，只需与两个基图像做内积。
+
+POS1, POS2 = (3, 2), (2, 3)
+DELTA = 5.0  # 修改强度
+
+_dct_matrices = {}
+
+
+def dct_matrix(n=8):
+    """n×n 正交 DCT-II 矩阵"""
+    D = _dct_matrices.get(n)
+    if D is None:
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        D = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        D[0] /= np.sqrt(2.0)
+        _dct_matrices[n] = D
+    return D
+
+
+def block_view(img, block_size=8):
+    """把图像看成 (行块数, 列块数, block_size, block_size[, 通道]) 的视图，不复制数据
+
+    不足一块的右侧和底部边缘不参与嵌入。
+    """
+    h, w = img.shape[:2]
+    hb, wb = h // block_size, w // block_size
+    cropped = img[:hb * block_size, :wb * block_size]
+    return cropped.reshape(hb, block_size, wb, block_size, *img.shape[2:]).swapaxes(1, 2)
+
+
+# ---------------- 块嵌入顺序 ----------------
+# key=None 时沿用原始顺序：Random(42) 打乱全部块号（与逐块实现一致）。
+# 给定密钥时用按密钥生成轮密钥的 Feistel 网络在 [0, 2^2b) 上构造置换，超出块数的
+# 结果继续迭代（cycle-walking）直到落回 [0, nblocks)。第 i 个块只依赖 i，
+# 所以只需计算实际用到的前缀，扩展前缀也不会改变已有部分。
+# 结果按 (h, w, block_size, key) 缓存，同分辨率的帧只计算一次。
+
+FEISTEL_ROUNDS = 6
+ORDER_CACHE_SIZE = 64
+
+_order_cache = OrderedDict()
+_order_lock = threading.Lock()
+
+
+def _key_bytes(key):
+    if isinstance(key, str):
+        return key.encode()
+    if isinstance(key, int):
+        return key.to_bytes((key.bit_length() + 8) // 8, "big", signed=True)
+    return bytes(key)
+
+
+def _mix64(x):
+    """splitmix64 的输出函数，作为 Feistel 轮函数（uint64 数组，乘法自然回绕）"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class FeistelPermutation:
+    """[0, n) 上的带密钥伪随机置换，按下标批量求值"""
+
+    def __init__(self, n, key, rounds=FEISTEL_ROUNDS):
+        self.n = n
+        self.half_bits = max(1, ((n - 1).bit_length() + 1) // 2)
+        digest = hashlib.blake2b(_key_bytes(key), digest_size=8 * rounds, person=b"dct-block-order").digest()
+        self.round_keys = np.frombuffer(digest, dtype=">u8").astype(np.uint64)
+
+    def _encrypt(self, x):
+        b = np.uint64(self.half_bits)
+        mask = np.uint64((1 << self.half_bits) - 1)
+        left, right = x >> b, x & mask
+        with np.errstate(over="ignore"):
+            for k in self.round_keys:
+                left, right = right, left ^ (_mix64(right ^ k) & mask)
+        return (left << b) | right
+
+    def __call__(self, index):
+        x = self._encrypt(np.asarray(index, dtype=np.uint64))
+        out = x >= self.n
+        while out.any():  # 定义域最多是 n 的 4 倍，期望迭代次数很少
+            x[out] = self._encrypt(x[out])
+            out = x >= self.n
+        return x.astype(np.int64)
+
+
+def _legacy_order(nblocks):
+    order = list(range(nblocks))
+    random.Random(42).shuffle(order)  # 与 random.seed(42); random.shuffle(block_coords) 相同
+    return np.array(order, dtype=np.int64)
+
+
+def block_order(h, w, block_size=8, count=None, key=None):
+    """嵌入顺序的前 count 个块号（行主序编号），count=None 为全部块
+
+    返回的数组在线程间共享，只读。
+    """
+    nblocks = (h // block_size) * (w // block_size)
+    count = nblocks if count is None else min(count, nblocks)
+    cache_key = (h, w, block_size, None if key is None else _key_bytes(key))
+    with _order_lock:
+        order = _order_cache.get(cache_key)
+        if order is None or len(order) < count:
+            if key is None:
+                order = _legacy_order(nblocks)
+            else:
+                done = 0 if order is None else len(order)
+                # 前缀成倍增长，避免逐次小幅扩展
+                grow = min(nblocks, max(count, 2 * done))
+                perm = FeistelPermutation(nblocks, key)
+                tail = perm(np.arange(done, grow))
+                order = tail if order is None else np.concatenate([order, tail])
+            order.setflags(write=False)
+            _order_cache[cache_key] = order
+        _order_cache.move_to_end(cache_key)
+        while len(_order_cache) > ORDER_CACHE_SIZE:
+            _order_cache.popitem(last=False)
+    return order[:count]
+
+
+def _pair_basis(block_size):
+    """两个嵌入位置的基图像，形状 (2, block_size²)，系数即块与其内积"""
+    D = dct_matrix(block_size)
+    return np.stack([np.outer(D[u], D[v]).ravel() for u, v in (POS1, POS2)]).astype(np.float32)
+
+
+def gather_blocks(view, index):
+    """按行主序块号取出块，返回 (n, block_size²) 的副本
+
+    选中的块较少时直接在视图上花式索引；较多时先整体拷贝成连续的块数组再取，
+    后者的单块开销约为前者的四分之一。
+    """
+    hb, wb = view.shape[:2]
+    if len(index) * 4 < hb * wb:
+        rows, cols = np.divmod(index, wb)
+        return view[rows, cols].reshape(len(index), -1)
+    return np.ascontiguousarray(view).reshape(hb * wb, -1)[index]
+
+
+def scatter_blocks(view, index, blocks):
+    """gather_blocks 的逆操作，把块写回视图（即写回原图）"""
+    hb, wb, bs = view.shape[:3]
+    if len(index) * 4 < hb * wb:
+        rows, cols = np.divmod(index, wb)
+        view[rows, cols] = blocks.reshape(-1, bs, bs)
+    else:
+        tiles = np.ascontiguousarray(view).reshape(hb * wb, -1)
+        tiles[index] = blocks
+        view[...] = tiles.reshape(view.shape)
+
+
+def text_to_bits(text):
+    return np.unpackbits(np.frombuffer(bytes(ord(c) for c in text), dtype=np.uint8))
+
+
+def bits_to_text(bits):
+    return ''.join(chr(b) for b in np.packbits(np.asarray(bits, dtype=np.uint8)))
 
-    max_blocks = (h // block_size) * (w // block_size)
-    needed_blocks = total_bits * redundancy
 
-    if needed_blocks > max_blocks:
+def _adjustments(c1, c2, want, delta, margin):
+    """返回 (需要修改的块掩码, 两个系数的增量 (n, 2))"""
+    # bit=1 要求 c1 - c2 > margin，否则令 c1 = c2 + delta；bit=0 反之
+    d = np.zeros((len(c1), 2), dtype=np.float32)
+    fix1 = want & (c1 - c2 <= margin)
+    fix0 = ~want & (c2 - c1 <= margin)
+    d[fix1, 0] = (c2 + delta - c1)[fix1]
+    d[fix0, 1] = (c1 + delta - c2)[fix0]
+    return fix1 | fix0, d
+
+
+def _embed_blocks(view, index, want, delta, margin):
+    """在 view 中块号为 index 的块上嵌入比特 want（布尔数组，与 index 一一对应）"""
+    basis = _pair_basis(view.shape[-1])
+    blocks = gather_blocks(view, index).astype(np.float32)  # 只取出被选中的块
+    c1, c2 = (blocks @ basis.T).T
+
+    changed, d = _adjustments(c1, c2, want, delta, margin)  # 只写回被修改的块
+    blocks = blocks[changed] + d[changed] @ basis
+    np.rint(blocks, out=blocks)
+    np.clip(blocks, 0, 255, out=blocks)
+    scatter_blocks(view, index[changed], blocks.astype(np.uint8))
+
+
+def _block_coefficients(view, index):
+    """块号为 index 的块在两个嵌入位置上的系数 (c1, c2)"""
+    blocks = gather_blocks(view, index).astype(np.float32)
+    return (blocks @ _pair_basis(view.shape[-1]).T).T
+
+
+def _vote(c1, c2, threshold):
+    """c1、c2 形状为 (比特数, redundancy)，按冗余块多数投票"""
+    valid = np.abs(c1 - c2) >= threshold  # 弱比较差距，不参与投票
+    ones = valid & (c1 > c2)
+    n_ones = ones.sum(axis=1)
+    n_zeros = valid.sum(axis=1) - n_ones
+
+    # 多数投票；票数相同时取第一张有效票（与 Counter.most_common 一致），无票为 0
+    first = ones[np.arange(len(c1)), valid.argmax(axis=1)]
+    return np.where(n_ones == n_zeros, first, n_ones > n_zeros).astype(np.uint8)
+
+
+def _selected_blocks(h, w, block_size, count, key, order):
+    if count > (h // block_size) * (w // block_size):
         raise ValueError("Not enough blocks to embed watermark with redundancy")
+    if order is None:
+        order = block_order(h, w, block_size, count, key)
+    return order[:count]
 
-    # 初始化图像副本
-    watermarked_img = np.copy(img).astype(np.float32)
 
-    # 获取所有块坐标
-    block_coords = [(r, c) for r in range(0, h - block_size + 1, block_size)
-                           for c in range(0, w - block_size + 1, block_size)]
-    random.seed(42)  # 固定嵌入顺序
-    random.shuffle(block_coords)
+def embed_bits(img, bits, block_size=8, redundancy=3, delta=DELTA, margin=1.0, key=None, order=None):
+    """把比特数组嵌入灰度图 img（uint8，原地修改），每个比特重复 redundancy 个块
 
-    pos1, pos2 = (3, 2), (2, 3)
-    delta = 5.0  # 修改强度
+    系数差已符合比特但不超过 margin 的块也会被拉开到 delta，否则提取时会因
+    小于阈值被跳过；margin=0 即逐块实现的原始判定。块顺序由 key 决定（见 block_order），
+    也可以直接传入 order。
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    h, w = img.shape[:2]
+    index = _selected_blocks(h, w, block_size, len(bits) * redundancy, key, order)
+    want = np.repeat(bits, redundancy).astype(bool)
+    _embed_blocks(block_view(img, block_size), index, want, delta, margin)
+    return img
 
-    block_ptr = 0
-    for bit in watermark_bin:
-        for _ in range(redundancy):
-            row, col = block_coords[block_ptr]
-            block = watermarked_img[row:row+block_size, col:col+block_size]
-            dct_block = block_dct(block)
 
-            c1, c2 = dct_block[pos1], dct_block[pos2]
-            if int(bit) == 1 and c1 <= c2:
-                dct_block[pos1] = c2 + delta
-            elif int(bit) == 0 and c1 >= c2:
-                dct_block[pos2] = c1 + delta
+def extract_bits(img, total_bits, block_size=8, redundancy=3, threshold=1.0, key=None, order=None):
+    """从灰度图中提取 total_bits 个比特，按冗余块多数投票"""
+    h, w = img.shape[:2]
+    index = _selected_blocks(h, w, block_size, total_bits * redundancy, key, order)
+    c1, c2 = _block_coefficients(block_view(img, block_size), index)
+    return _vote(c1.reshape(total_bits, redundancy), c2.reshape(total_bits, redundancy), threshold)
 
-            idct_block = block_idct(dct_block)
-            watermarked_img[row:row+block_size, col:col+block_size] = np.clip(idct_block, 0, 255)
-            block_ptr += 1
 
-    cv2.imwrite(output_path, np.uint8(watermarked_img))
-    print(f" Robust DCT Watermark embedded into {output_path}")
+# ---------------- 分条处理 ----------------
+# 超大图像（np.memmap 映射的原始灰度数据等）按 strip_rows 个块行一条地处理，块选择与
+# 整图处理完全相同，结果逐位一致。每次只访问一条中被选中的块，内存占用只与条带大小和
+# 水印长度有关。key=None 的原始顺序需要在内存中打乱全部块号，块数超过 LEGACY_ORDER_LIMIT
+# 时拒绝处理，须传入 key（或 order）。
 
+STRIP_ROWS = 64
+LEGACY_ORDER_LIMIT = 1 << 20  # 约 8192×8192 像素；原始顺序的块号列表约 40 MB
 
-def extract_dct_watermark_robust(image_path, watermark_length, block_size=8, redundancy=3, threshold=1.0):
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    h, w = img.shape
-
-    total_bits = watermark_length * 8
-    total_samples = total_bits * redundancy
-
-    # 重新获取块顺序
-    block_coords = [(r, c) for r in range(0, h - block_size + 1, block_size)
-                           for c in range(0, w - block_size + 1, block_size)]
-    random.seed(42)
-    random.shuffle(block_coords)
-
-    pos1, pos2 = (3, 2), (2, 3)
-    bit_votes = []
-
-    for i in range(total_bits):
-        votes = []
-        for j in range(redundancy):
-            idx = i * redundancy + j
-            row, col = block_coords[idx]
-            block = img[row:row+block_size, col:col+block_size].astype(np.float32)
-            dct_block = block_dct(block)
-
-            c1, c2 = dct_block[pos1], dct_block[pos2]
-            if abs(c1 - c2) < threshold:
-                continue  # 弱比较差距，跳过
-            bit = 1 if c1 > c2 else 0
-            votes.append(bit)
-
-        # 多数投票
-        if votes:
-            bit = Counter(votes).most_common(1)[0][0]
-        else:
-            bit = 0  # 默认值
-        bit_votes.append(str(bit))
 
-    chars = [chr(int(''.join(bit_votes[i:i+8]), 2)) for i in range(0, len(bit_votes), 8)]
-    return ''.join(chars)
+def _tiled_blocks(h, w, block_size, count, key, order):
+    nblocks = (h // block_size) * (w // block_size)
+    if key is None and order is None and nblocks > LEGACY_ORDER_LIMIT:
+        raise ValueError(f"{nblocks} blocks: the unkeyed order shuffles every block index in memory, "
+                         f"pass a key for images above {LEGACY_ORDER_LIMIT} blocks")
+    return _selected_blocks(h, w, block_size, count, key, order)
 
 
-# attack.py
+def _strips(index, wb, hb, strip_rows):
+    """把选中的块按所在条带分组，产出 (起始块行, 块行数, 样本下标)"""
+    strip = index // (wb * strip_rows)
+    members = np.argsort(strip, kind="stable")
+    bounds = np.cumsum(np.bincount(strip, minlength=-(-hb // strip_rows)))
+    start = 0
+    for s, end in enumerate(bounds):
+        if end > start:
+            r0 = s * strip_rows
+            yield r0, min(strip_rows, hb - r0), members[start:end]
+        start = end
 
-def flip_image(image_path, output_path):
-    img = cv2.imread(image_path)
-    flipped = cv2.flip(img, 1)
-    cv2.imwrite(output_path, flipped)
 
-def translate_image(image_path, output_path, tx=10, ty=10):
-    img = cv2.imread(image_path)
-    rows, cols = img.shape[:2]
-    M = np.float32([[1, 0, tx], [0, 1, ty]])
-    translated = cv2.warpAffine(img, M, (cols, rows))
-    cv2.imwrite(output_path, translated)
+def embed_bits_tiled(img, bits, block_size=8, redundancy=3, delta=DELTA, margin=1.0, key=None, order=None,
+                     strip_rows=STRIP_ROWS):
+    """embed_bits 的分条版本，img 可以是 np.memmap，处理完后 flush"""
+    bits = np.asarray(bits, dtype=np.uint8)
+    h, w = img.shape[:2]
+    wb, hb = w // block_size, h // block_size
+    index = _tiled_blocks(h, w, block_size, len(bits) * redundancy, key, order)
+    want = np.repeat(bits, redundancy).astype(bool)
+    for r0, rows, members in _strips(index, wb, hb, strip_rows):
+        view = block_view(img[r0 * block_size:(r0 + rows) * block_size], block_size)
+        _embed_blocks(view, index[members] - r0 * wb, want[members], delta, margin)
+    if isinstance(img, np.memmap):
+        img.flush()
+    return img
+
 
-def crop_image(image_path, output_path, crop_percent=0.1):
-    img = cv2.imread(image_path)
+def extract_bits_tiled(img, total_bits, block_size=8, redundancy=3, threshold=1.0, key=None, order=None,
+                       strip_rows=STRIP_ROWS):
     h, w = img.shape[:2]
-    crop_h = int(h * crop_percent)
-    crop_w = int(w * crop_percent)
-    cropped = img[crop_h:h - crop_h, crop_w:w - crop_w]
-    resized = cv2.resize(cropped, (w, h))
-    cv2.imwrite(output_path, resized)
-
-def adjust_contrast(image_path, output_path, alpha=1.5, beta=0):
-    img = cv2.imread(image_path)
-    adjusted = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
-    cv2.imwrite(output_path, adjusted)
+    wb, hb = w // block_size, h // block_size
+    index = _tiled_blocks(h, w, block_size, total_bits * redundancy, key, order)
+    c1 = np.empty(len(index), dtype=np.float32)
+    c2 = np.empty(len(index), dtype=np.float32)
+    for r0, rows, members in _strips(index, wb, hb, strip_rows):
+        view = block_view(img[r0 * block_size:(r0 + rows) * block_size], block_size)
+        c1[members], c2[members] = _block_coefficients(view, index[members] - r0 * wb)
+    return _vote(c1.reshape(total_bits, redundancy), c2.reshape(total_bits, redundancy), threshold)
+
+
+# ---------------- 逐帧上下文 ----------------
+
+class DCTWatermarkContext:
+    """同一分辨率、密钥和水印长度下逐帧嵌入/提取的上下文
+
+    构造时一次性确定块调度、基图像和缓冲区，之后每帧只做一次灰度转换和选中块上的运算。
+    彩色帧（BGR）嵌入到亮度 Y：Y = 0.299R + 0.587G + 0.114B 的系数和为 1，块内三个通道
+    同时加上 ΔY 后亮度变化 ΔY，色度 Cr、Cb 不变，不需要整帧做颜色空间往返。
+    """
+
+    def __init__(self, height, width, nbits, block_size=8, redundancy=3, delta=DELTA, margin=1.0,
+                 threshold=1.0, key=None):
+        self.shape = (height, width)
+        self.nbits = nbits
+        self.block_size = block_size
+        self.redundancy = redundancy
+        self.delta = delta
+        self.margin = margin
+        self.threshold = threshold
+        index = _selected_blocks(height, width, block_size, nbits * redundancy, key, None)
+        self.rows, self.cols = np.divmod(index, width // block_size)
+        self.basis = _pair_basis(block_size)
+        self._luma = np.empty(self.shape, dtype=np.uint8)
+
+    @classmethod
+    def for_frame(cls, frame, nbits, **kwargs):
+        return cls(frame.shape[0], frame.shape[1], nbits, **kwargs)
+
+    def _check(self, frame):
+        if frame.shape[:2] != self.shape:
+            raise ValueError(f"frame is {frame.shape[1]}x{frame.shape[0]}, context is {self.shape[1]}x{self.shape[0]}")
+        if frame.ndim == 3 and frame.shape[2] != 3:
+            raise ValueError("color frames must be 3-channel BGR")
+
+    def luma(self, frame):
+        """灰度帧原样返回，彩色帧转换到预分配的亮度缓冲区"""
+        if frame.ndim == 2:
+            return frame
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._luma)
+
+    def _coefficients(self, luma):
+        blocks = block_view(luma, self.block_size)[self.rows, self.cols]
+        blocks = blocks.reshape(len(self.rows), -1).astype(np.float32)
+        return blocks, (blocks @ self.basis.T).T
+
+    def embed(self, frame, bits):
+        """把 nbits 个比特嵌入帧（uint8 灰度或 BGR，原地修改）并返回该帧"""
+        self._check(frame)
+        bits = np.asarray(bits, dtype=np.uint8)
+        if len(bits) != self.nbits:
+            raise ValueError(f"context expects {self.nbits} bits, got {len(bits)}")
+        blocks, (c1, c2) = self._coefficients(self.luma(frame))
+        changed, d = _adjustments(c1, c2, np.repeat(bits, self.redundancy).astype(bool), self.delta, self.margin)
+        if not changed.any():  # 例如已带有同一水印的帧
+            return frame
+        rows, cols = self.rows[changed], self.cols[changed]
+        diff = d[changed] @ self.basis  # 每个被修改块的亮度增量 (m, bs²)
+        view = block_view(frame, self.block_size)
+        if frame.ndim == 2:
+            pixels = blocks[changed] + diff
+        else:
+            pixels = view[rows, cols].reshape(len(rows), diff.shape[1], 3).astype(np.float32) + diff[:, :, None]
+        np.rint(pixels, out=pixels)
+        np.clip(pixels, 0, 255, out=pixels)
+        view[rows, cols] = pixels.astype(np.uint8).reshape(view[rows, cols].shape)
+        return frame
+
+    def extract(self, frame):
+        self._check(frame)
+        _, (c1, c2) = self._coefficients(self.luma(frame))
+        shape = (self.nbits, self.redundancy)
+        return _vote(c1.reshape(shape), c2.reshape(shape), self.threshold)
+
+    def embed_stream(self, frames, bits):
+        """逐帧嵌入，frames 可以是任意帧迭代器（如 read_frames(cv2.VideoCapture(...))）"""
+        for frame in frames:
+            yield self.embed(frame, bits)
+
+
+def read_frames(capture):
+    """把 cv2.VideoCapture 包装成帧迭代器"""
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            return
+        yield frame
+
+
+def embed_dct_watermark_robust(image_path, watermark_text, output_path, block_size=8, redundancy=3, key=None,
+                               color=False):
+    """color=True 时保留颜色，水印嵌入亮度通道；缺省与原实现一样输出灰度图"""
+    bits = text_to_bits(watermark_text)
+    if color:
+        img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        DCTWatermarkContext.for_frame(img, len(bits), block_size=block_size, redundancy=redundancy,
+                                      key=key).embed(img, bits)
+    else:
+        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        embed_bits(img, bits, block_size, redundancy, key=key)
+    cv2.imwrite(output_path, img)
+    print(f" Robust DCT Watermark embedded into {output_path}")
+
+
+def extract_dct_watermark_robust(image_path, watermark_length, block_size=8, redundancy=3, threshold=1.0, key=None):
+    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    bits = extract_bits(img, watermark_length * 8, block_size, redundancy, threshold, key=key)
+    return bits_to_text(bits)
+
 
 if __name__ == "__main__":
     original = "data/original.jpg"
@@ -1,63 +1,128 @@
 # watermark_embed.py
 import cv2
 import numpy as np
+from attacks import adjust_contrast_image as adjust_contrast, crop_image, flip_image, translate_image  # 原接口
 
-def embed_lsb(image_path, watermark_text, output_path):
-    img = cv2.imread(image_path)
-    h, w, c = img.shape
-    flat = img.flatten()
+# ---------------- 向量化 LSB ----------------
+# 载体样本按像素行主序、像素内按所选通道顺序排列；每个样本的低 planes 位依次存放
+# planes 个比特（先放的比特在高位）。planes=1、使用全部通道时与原始逐像素实现的布局相同。
+# 带长度头的载荷格式：4 字节大端长度 ‖ 载荷字节，提取时无需事先知道长度。
+
+HEADER_BYTES = 4
+
+
+def _carrier(img, channels):
+    """返回 (像素数, 通道数) 的二维视图、所选通道的下标和所选通道数
+
+    所选通道连续递增时返回切片，取列是普通切片而不是较慢的花式索引。
+    """
+    if not img.flags.c_contiguous:
+        raise ValueError("image array must be C-contiguous")
+    pixels = img.reshape(img.shape[0] * img.shape[1], -1)  # 视图，写入即修改原图
+    if channels is None:
+        channels = range(pixels.shape[1])
+    channels = np.asarray(list(channels), dtype=np.intp)
+    if channels.size == 0 or channels.min() < 0 or channels.max() >= pixels.shape[1]:
+        raise ValueError(f"invalid channels for image with {pixels.shape[1]} channel(s)")
+    if (np.diff(channels) == 1).all():
+        return pixels, slice(channels[0], channels[-1] + 1), len(channels)
+    return pixels, channels, len(channels)
+
+
+def capacity_bits(img, planes=1, channels=None):
+    pixels, _, nch = _carrier(img, channels)
+    return pixels.shape[0] * nch * planes
 
-    # Convert watermark to binary
-    watermark_bin = ''.join(format(ord(c), '08b') for c in watermark_text)
-    watermark_len = len(watermark_bin)
 
-    if watermark_len > len(flat):
+def embed_bits_lsb(img, bits, planes=1, channels=None):
+    """把比特数组写入 img（uint8，原地修改）的低 planes 位，只改动用到的前缀像素"""
+    if not 1 <= planes <= 8:
+        raise ValueError("planes must be in 1..8")
+    bits = np.asarray(bits, dtype=np.uint8)
+    if len(bits) > capacity_bits(img, planes, channels):
         raise ValueError("Watermark too large for the image.")
+    pixels, channels, nch = _carrier(img, channels)
+
+    samples = -(-len(bits) // planes)
+    values = np.zeros(samples, dtype=np.uint8)
+    for j in range(planes):  # 第 j 个比特放在第 planes-1-j 位，末组不足的比特为 0
+        plane = bits[j::planes]
+        values[:len(plane)] |= plane << np.uint8(planes - 1 - j)
+
+    npix = -(-samples // nch)
+    carrier = pixels[:npix, channels].reshape(-1)
+    mask = np.uint8((1 << planes) - 1)
+    carrier[:samples] = (carrier[:samples] & ~mask) | values
+    pixels[:npix, channels] = carrier.reshape(npix, nch)
+    return img
+
+
+def extract_bits_lsb(img, nbits, planes=1, channels=None):
+    if not 1 <= planes <= 8:
+        raise ValueError("planes must be in 1..8")
+    capacity = capacity_bits(img, planes, channels)
+    if not 0 <= nbits <= capacity:
+        raise ValueError(f"cannot extract {nbits} bits: image capacity is {capacity} bits")
+    pixels, channels, nch = _carrier(img, channels)
+    samples = -(-nbits // planes)
+    npix = -(-samples // nch)
+    carrier = pixels[:npix, channels].reshape(-1)[:samples]
+    bits = np.empty((samples, planes), dtype=np.uint8)
+    for j in range(planes):
+        bits[:, j] = (carrier >> np.uint8(planes - 1 - j)) & np.uint8(1)
+    return bits.reshape(-1)[:nbits]
+
+
+def embed_payload(img, payload, planes=1, channels=None):
+    """嵌入带 4 字节长度头的载荷（bytes，str 按 UTF-8 编码）"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    data = len(payload).to_bytes(HEADER_BYTES, "big") + bytes(payload)
+    return embed_bits_lsb(img, np.unpackbits(np.frombuffer(data, dtype=np.uint8)), planes, channels)
+
+
+def extract_payload(img, planes=1, channels=None):
+    capacity = capacity_bits(img, planes, channels)
+    if HEADER_BYTES * 8 > capacity:
+        raise ValueError("no LSB payload found (image too small for the length header)")
+    header = np.packbits(extract_bits_lsb(img, HEADER_BYTES * 8, planes, channels)).tobytes()
+    length = int.from_bytes(header, "big")
+    total = (HEADER_BYTES + length) * 8
+    if total > capacity:
+        raise ValueError("no LSB payload found (length header exceeds capacity)")
+    return np.packbits(extract_bits_lsb(img, total, planes, channels)[HEADER_BYTES * 8:]).tobytes()
+
+
+def _text_bits(text):
+    try:
+        data = text.encode("latin-1")
+    except UnicodeEncodeError:
+        raise ValueError("embed_lsb stores one byte per character; use embed_payload for other text") from None
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8))
 
-    # Embed watermark bits into LSB (use 0xFE to mask last bit)
-    for i in range(watermark_len):
-        flat[i] = (flat[i] & 0xFE) | int(watermark_bin[i])  # fix here
 
-    watermarked_img = flat.reshape(img.shape)
-    cv2.imwrite(output_path, watermarked_img)
+# watermark_embed.py
+def embed_lsb(image_path, watermark_text, output_path):
+    img = cv2.imread(image_path)
+    embed_bits_lsb(img, _text_bits(watermark_text))
+    cv2.imwrite(output_path, img)
     print(f"Watermark embedded and saved to {output_path}")
 
 # watermark_extract.py
 def extract_lsb(image_path, watermark_length):
     img = cv2.imread(image_path)
-    flat = img.flatten()
-
-    bits = [str(flat[i] & 1) for i in range(watermark_length * 8)]
-    chars = [chr(int(''.join(bits[i:i+8]), 2)) for i in range(0, len(bits), 8)]
-    return ''.join(chars)
+    bits = extract_bits_lsb(img, watermark_length * 8)
+    return np.packbits(bits).tobytes().decode("latin-1")
 
-# attack.py
 
-def flip_image(image_path, output_path):
-    img = cv2.imread(image_path)
-    flipped = cv2.flip(img, 1)
-    cv2.imwrite(output_path, flipped)
+def embed_lsb_payload(image_path, payload, output_path, planes=1, channels=None):
+    img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+    embed_payload(img, payload, planes, channels)
+    cv2.imwrite(output_path, img)
 
-def translate_image(image_path, output_path, tx=10, ty=10):
-    img = cv2.imread(image_path)
-    rows, cols = img.shape[:2]
-    M = np.float32([[1, 0, tx], [0, 1, ty]])
-    translated = cv2.warpAffine(img, M, (cols, rows))
-    cv2.imwrite(output_path, translated)
 
-def crop_image(image_path, output_path, crop_percent=0.1):
-    img = cv2.imread(image_path)
-    h, w = img.shape[:2]
-    crop_h = int(h * crop_percent)
-    crop_w = int(w * crop_percent)
-    cropped = img[crop_h:h - crop_h, crop_w:w - crop_w]
-    resized = cv2.resize(cropped, (w, h))
-    cv2.imwrite(output_path, resized)
-
-def adjust_contrast(image_path, output_path, alpha=1.5, beta=0):
-    img = cv2.imread(image_path)
-    adjusted = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
-    cv2.imwrite(output_path, adjusted)
+def extract_lsb_payload(image_path, planes=1, channels=None):
+    return extract_payload(cv2.imread(image_path, cv2.IMREAD_UNCHANGED), planes, channels)
 
 # test.py
 if __name__ == "__main__":
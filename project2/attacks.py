@@ -0,0 +1,85 @@
+"""水印鲁棒性测试用的图像攻击
+
+每种攻击都是作用在 uint8 数组上的函数（灰度或彩色均可），不经过文件；
+flip_image 等按路径读写的版本保留原有接口。
+"""
+import cv2
+import numpy as np
+
+
+def flip(img, flip_code=1):
+    return cv2.flip(img, flip_code)
+
+
+def translate(img, tx=10, ty=10):
+    rows, cols = img.shape[:2]
+    M = np.float32([[1, 0, tx], [0, 1, ty]])
+    return cv2.warpAffine(img, M, (cols, rows))
+
+
+def shift(img, offset=(10, 10)):
+    """按 (tx, ty) 平移，供参数网格使用"""
+    tx, ty = offset
+    return translate(img, tx, ty)
+
+
+def crop(img, crop_percent=0.1):
+    """四周各裁去 crop_percent 后缩放回原尺寸"""
+    h, w = img.shape[:2]
+    crop_h = int(h * crop_percent)
+    crop_w = int(w * crop_percent)
+    cropped = img[crop_h:h - crop_h, crop_w:w - crop_w]
+    return cv2.resize(cropped, (w, h))
+
+
+def adjust_contrast(img, alpha=1.5, beta=0):
+    return cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
+
+
+def jpeg(img, quality=75):
+    """内存中 JPEG 压缩再解码"""
+    ok, data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+
+
+def gaussian_noise(img, sigma=2.0, seed=0):
+    noise = np.random.default_rng(seed).normal(0, sigma, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+def identity(img, _=None):
+    return img
+
+
+# 名称 -> (函数, 默认参数网格)；参数作为第二个位置参数传入
+ATTACKS = {
+    "none": (identity, [None]),
+    "flip": (flip, [1]),
+    "translate": (shift, [(2, 2), (10, 10)]),
+    "crop": (crop, [0.05, 0.1]),
+    "contrast": (adjust_contrast, [0.8, 1.5]),
+    "jpeg": (jpeg, [95, 75, 50]),
+    "noise": (gaussian_noise, [1.0, 4.0]),
+}
+
+
+def _apply_file(func, image_path, output_path, *args, **kwargs):
+    cv2.imwrite(output_path, func(cv2.imread(image_path), *args, **kwargs))
+
+
+def flip_image(image_path, output_path):
+    _apply_file(flip, image_path, output_path)
+
+
+def translate_image(image_path, output_path, tx=10, ty=10):
+    _apply_file(translate, image_path, output_path, tx, ty)
+
+
+def crop_image(image_path, output_path, crop_percent=0.1):
+    _apply_file(crop, image_path, output_path, crop_percent)
+
+
+def adjust_contrast_image(image_path, output_path, alpha=1.5, beta=0):
+    _apply_file(adjust_contrast, image_path, output_path, alpha, beta)
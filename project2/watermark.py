@@ -0,0 +1,482 @@
+"""批量水印处理命令行
+
+    python watermark.py batch embed data/in --output data/out --text Hidden123 --workers 4
+    python watermark.py batch extract data/out --length 9 --checkpoint extract.jsonl
+
+输入可以是目录（递归查找图片）或清单文件（每行一个路径，可用制表符跟一个输出路径，
+相对路径相对清单所在目录）。主进程顺序读取文件字节并写检查点，解码、嵌入/提取、编码和
+写出在进程池中完成，最多 2*workers 个文件同时在途，磁盘读取与计算重叠。彩色图片嵌入亮度通道，
+输出保持输入的通道数（灰度、BGR 或带 alpha 的 BGRA）。
+
+输出先写入同目录的临时文件再 os.replace，中断不会留下半张图片。每个文件处理完后
+向检查点（JSONL）追加一行状态与耗时，重新运行时跳过以相同参数（模式、水印、密钥、块大小、冗余度等）成功处理过的文件。
+
+超大灰度图（二进制 PGM 或无文件头的原始 uint8 数据）用 tiled 子命令通过 np.memmap
+按条带处理，不整体读入内存：
+
+    python watermark.py tiled embed map.pgm map_wm.pgm --text Hidden123 --key mykey
+    python watermark.py tiled extract map_wm.pgm --length 9 --key mykey
+    python watermark.py tiled extract scan.raw --shape 40000 60000 --length 9 --key mykey
+
+视频逐帧嵌入到亮度通道（DCTWatermarkContext），解码在后台线程中预读，与嵌入和编码重叠：
+
+    python watermark.py video embed in.mp4 out.avi --text Hidden123 --key mykey --fourcc FFV1
+    python watermark.py video extract out.avi --length 9 --key mykey
+"""
+import argparse
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import stat
+import sys
+import threading
+import time
+from collections import deque
+from queue import Queue
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from DCT import (DELTA, STRIP_ROWS, DCTWatermarkContext, bits_to_text, embed_bits_tiled, extract_bits_tiled, read_frames,
+                 text_to_bits)
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp"}
+CHECKPOINT_NAME = "checkpoint.jsonl"
+
+
+def create_temp(directory):
+    """在 directory 中新建临时文件，返回 (fd, 路径)
+
+    与 mkstemp（0600）不同，以 0o666 创建，由内核按 umask 裁剪，权限与直接 open/cv2.imwrite 新建相同。
+    """
+    while True:
+        tmp = os.path.join(directory, f".{secrets.token_hex(8)}.tmp")
+        try:
+            return os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666), tmp
+        except FileExistsError:
+            continue
+
+
+def keep_mode(tmp, path):
+    """覆盖已有文件时沿用其权限"""
+    try:
+        os.chmod(tmp, stat.S_IMODE(os.stat(path).st_mode))
+    except FileNotFoundError:
+        pass
+
+
+def atomic_write(path, data):
+    """写入临时文件并 fsync 后原子替换目标文件"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = create_temp(directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        keep_mode(tmp, path)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def list_inputs(source, output_dir=None, fmt=None):
+    """返回 [(输入路径, 输出路径)]，输出路径在 output_dir 为 None 时也为 None
+
+    目录输入保持相对目录结构；fmt 为输出扩展名（如 "png"），默认沿用输入扩展名。
+    """
+    def target(rel):
+        if output_dir is None:
+            return None
+        if fmt:
+            rel = os.path.splitext(rel)[0] + "." + fmt.lstrip(".")
+        return os.path.join(output_dir, rel)
+
+    jobs = []
+    if os.path.isdir(source):
+        skip = os.path.abspath(output_dir) if output_dir else None
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != skip)
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    path = os.path.join(root, name)
+                    jobs.append((path, target(os.path.relpath(path, source))))
+        return jobs
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path, _, out = line.partition("\t")
+            path = os.path.join(base, path)
+            if out:
+                out = os.path.join(base, out) if output_dir is None else os.path.join(output_dir, out)
+            else:
+                out = target(os.path.basename(path))
+            jobs.append((path, out))
+    return jobs
+
+
+def params_digest(params):
+    """处理参数（模式、水印、密钥、块大小、冗余度等）的摘要，随检查点记录保存"""
+    canonical = {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in params.items()}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def load_checkpoint(path, params):
+    """以相同参数成功处理过的输入路径集合；换了密钥等参数的记录不算，末尾被截断的行忽略"""
+    done = set()
+    if path is None or not os.path.exists(path):
+        return done
+    digest = params_digest(params)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("params") == digest and record.get("status") == "ok":
+                done.add(record["input"])
+    return done
+
+
+def decode_image(data):
+    """解码为 8 位灰度、BGR 或 BGRA 图像，保留输入的通道数
+
+    JPEG 没有 alpha 通道，按 IMREAD_ANYCOLOR 解码以应用 EXIF 方向；其他格式按 IMREAD_UNCHANGED
+    解码，位深不是 8 位时再按 IMREAD_ANYCOLOR 转换为 8 位。
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    img = cv2.imdecode(buf, cv2.IMREAD_ANYCOLOR if data[:2] == b"\xff\xd8" else cv2.IMREAD_UNCHANGED)
+    if img is not None and img.dtype != np.uint8:
+        img = cv2.imdecode(buf, cv2.IMREAD_ANYCOLOR)
+    if img is None:
+        raise ValueError("cannot decode image")
+    return img
+
+
+def _process(path, data, output, params):
+    """在工作进程中解码、处理、编码并写出一张图片，返回状态记录"""
+    start = time.perf_counter()
+    record = {"input": path, "mode": params["mode"]}
+    try:
+        if isinstance(data, Exception):
+            raise data
+        img = decode_image(data)
+        # 灰度图与 embed_bits/extract_bits 结果相同；BGR 嵌入亮度，BGRA 的 alpha 通道原样保留
+        frame = np.ascontiguousarray(img[:, :, :3]) if img.ndim == 3 and img.shape[2] == 4 else img
+        nbits = len(params["bits"]) if params["mode"] == "embed" else params["length"] * 8
+        context = DCTWatermarkContext.for_frame(frame, nbits, block_size=params["block_size"],
+                                                redundancy=params["redundancy"], key=params["key"],
+                                                threshold=params.get("threshold", 1.0))
+        if params["mode"] == "embed":
+            context.embed(frame, params["bits"])
+            if frame is not img:
+                img[:, :, :3] = frame
+            ok, encoded = cv2.imencode(os.path.splitext(output)[1], img)
+            if not ok:
+                raise ValueError(f"cannot encode {output}")
+            atomic_write(output, encoded.tobytes())
+            record["output"] = output
+        else:
+            bits = context.extract(frame)
+            record["watermark"] = bits_to_text(bits)
+        record["status"] = "ok"
+    except Exception as exc:
+        record["status"] = "error"
+        record["error"] = f"{type(exc).__name__}: {exc}"
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def _read_jobs(jobs):
+    for path, output in jobs:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as exc:
+            data = exc
+        yield path, data, output
+
+
+def run_batch(jobs, params, workers=1, checkpoint=None):
+    """处理 jobs 并按输入顺序产出状态记录，同时追加到检查点
+
+    已在检查点中成功的文件跳过。workers=0 时在当前进程内顺序处理（便于调试）。
+    """
+    done = load_checkpoint(checkpoint, params)
+    digest = params_digest(params)
+    jobs = [job for job in jobs if job[0] not in done]
+    log = None
+    if checkpoint is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(checkpoint)), exist_ok=True)
+        log = open(checkpoint, "a", encoding="utf-8")
+
+    def record(result):
+        if log is not None:
+            log.write(json.dumps(dict(result, params=digest), ensure_ascii=False) + "\n")
+            log.flush()
+        return result
+
+    try:
+        if workers <= 0:
+            for job in _read_jobs(jobs):
+                yield record(_process(*job, params))
+            return
+        pool = ProcessPoolExecutor(workers)
+        pending = deque()
+        try:
+            for job in _read_jobs(jobs):
+                pending.append(pool.submit(_process, *job, params))
+                if len(pending) >= 2 * workers:
+                    yield record(pending.popleft().result())
+            while pending:
+                yield record(pending.popleft().result())
+        finally:
+            pool.shutdown(wait=not pending, cancel_futures=True)
+    finally:
+        if log is not None:
+            log.close()
+
+
+def _pgm_header(path):
+    """解析二进制 PGM（P5，8 位）文件头，返回 ((高, 宽), 数据偏移)"""
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    tokens, pos = [], 0
+    while len(tokens) < 4:
+        while pos < len(head) and head[pos:pos + 1].isspace():
+            pos += 1
+        if head[pos:pos + 1] == b"#":
+            pos = head.index(b"\n", pos)
+            continue
+        end = pos
+        while end < len(head) and not head[end:end + 1].isspace():
+            end += 1
+        if end == pos:
+            raise ValueError(f"{path}: truncated PGM header")
+        tokens.append(head[pos:end])
+        pos = end
+    if tokens[0] != b"P5" or int(tokens[3]) != 255:
+        raise ValueError(f"{path}: only 8-bit binary PGM (P5) is supported, use --shape for raw data")
+    return (int(tokens[2]), int(tokens[1])), pos + 1  # 头后恰好一个空白字符
+
+
+def open_image_map(path, shape=None, offset=0, mode="r"):
+    """把灰度图文件映射为 (高, 宽) 的 uint8 np.memmap
+
+    shape 为 None 时按 PGM 解析文件头，否则视为从 offset 起的原始行主序数据。
+    """
+    if shape is None:
+        shape, offset = _pgm_header(path)
+    return np.memmap(path, dtype=np.uint8, mode=mode, offset=offset, shape=tuple(shape))
+
+
+def tiled_command(args):
+    shape = tuple(args.shape) if args.shape else None
+    start = time.perf_counter()
+    if args.mode == "embed":
+        if args.output is None or args.text is None:
+            sys.exit("tiled embed requires an output path and --text")
+        # 先复制到同目录临时文件并在其上嵌入，完成后原子替换
+        directory = os.path.dirname(os.path.abspath(args.output))
+        fd, tmp = create_temp(directory)
+        os.close(fd)
+        try:
+            shutil.copyfile(args.input, tmp)
+            keep_mode(tmp, args.output)
+            img = open_image_map(tmp, shape, args.offset, mode="r+")
+            embed_bits_tiled(img, text_to_bits(args.text), args.block_size, args.redundancy, key=args.key,
+                             strip_rows=args.strip_rows)
+            del img
+            os.replace(tmp, args.output)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        result = {"input": args.input, "mode": "embed", "output": args.output}
+    else:
+        if args.length is None:
+            sys.exit("tiled extract requires --length")
+        img = open_image_map(args.input, shape, args.offset)
+        bits = extract_bits_tiled(img, args.length * 8, args.block_size, args.redundancy, args.threshold,
+                                  key=args.key, strip_rows=args.strip_rows)
+        result = {"input": args.input, "mode": "extract", "watermark": bits_to_text(bits)}
+    result.update(status="ok", seconds=round(time.perf_counter() - start, 4))
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def prefetch(iterable, maxsize=8):
+    """在后台线程中迭代 iterable，最多缓存 maxsize 项（cv2 解码时释放 GIL）"""
+    queue = Queue(maxsize)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                queue.put(item)
+        except BaseException as exc:
+            queue.put(exc)
+        finally:
+            queue.put(done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = queue.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive():  # 放出被阻塞的 put
+            while not queue.empty():
+                queue.get_nowait()
+            thread.join(0.01)
+
+
+def video_command(args):
+    capture = cv2.VideoCapture(args.input)
+    if not capture.isOpened():
+        sys.exit(f"cannot open {args.input}")
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    nbits = len(args.text) * 8 if args.mode == "embed" else args.length * 8
+    context = DCTWatermarkContext(height, width, nbits, args.block_size, args.redundancy, args.delta,
+                                  threshold=args.threshold, key=args.key)
+    frames = prefetch(read_frames(capture))
+    start = time.perf_counter()
+    count = 0
+    try:
+        if args.mode == "embed":
+            fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+            writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*args.fourcc), fps, (width, height))
+            if not writer.isOpened():
+                sys.exit(f"cannot open {args.output} for writing with fourcc {args.fourcc}")
+            try:
+                for frame in context.embed_stream(frames, text_to_bits(args.text)):
+                    writer.write(frame)
+                    count += 1
+            finally:
+                writer.release()
+            result = {"input": args.input, "mode": "embed", "output": args.output}
+        else:
+            per_frame = [context.extract(frame) for frame in frames]
+            count = len(per_frame)
+            # 各帧逐比特多数投票，并统计与投票结果完全一致的帧数
+            bits = (np.sum(per_frame, axis=0) * 2 > count).astype(np.uint8) if per_frame else np.zeros(nbits, np.uint8)
+            result = {"input": args.input, "mode": "extract", "watermark": bits_to_text(bits),
+                      "agreeing_frames": sum(int((b == bits).all()) for b in per_frame)}
+    finally:
+        capture.release()
+    elapsed = time.perf_counter() - start
+    result.update(status="ok", frames=count, seconds=round(elapsed, 4),
+                  fps=round(count / elapsed, 1) if elapsed else None)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def batch_command(args):
+    if args.mode == "embed":
+        if args.output is None or args.text is None:
+            sys.exit("embed requires --output and --text")
+        params = {"bits": text_to_bits(args.text)}
+    else:
+        if args.length is None:
+            sys.exit("extract requires --length")
+        params = {"length": args.length, "threshold": args.threshold}
+    params.update(mode=args.mode, block_size=args.block_size, redundancy=args.redundancy, key=args.key)
+
+    checkpoint = args.checkpoint
+    if checkpoint is None and args.output is not None:
+        checkpoint = os.path.join(args.output, CHECKPOINT_NAME)
+    jobs = list_inputs(args.input, args.output, args.format)
+    skipped = len(load_checkpoint(checkpoint, params) & {path for path, _ in jobs})
+
+    counts = {"ok": 0, "error": 0}
+    compute = 0.0
+    start = time.perf_counter()
+    for result in run_batch(jobs, params, args.workers, checkpoint):
+        counts[result["status"]] += 1
+        compute += result["seconds"]
+        if not args.quiet or result["status"] != "ok":
+            print(json.dumps(result, ensure_ascii=False))
+    elapsed = time.perf_counter() - start
+    processed = counts["ok"] + counts["error"]
+    print(f"{processed} processed ({counts['ok']} ok, {counts['error']} failed), {skipped} skipped; "
+          f"{elapsed:.2f}s wall, {compute:.2f}s worker time, "
+          f"{processed / elapsed if elapsed else 0:.1f} images/s", file=sys.stderr)
+    if counts["error"]:
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch and tiled DCT watermarking")
+    sub = parser.add_subparsers(dest="command", required=True)
+    batch = sub.add_parser("batch", help="对目录或清单中的所有图片嵌入/提取水印")
+    batch.add_argument("mode", choices=["embed", "extract"])
+    batch.add_argument("input", help="图片目录或清单文件")
+    batch.add_argument("--output", help="嵌入结果目录（embed 必需）")
+    batch.add_argument("--text", help="要嵌入的水印文本")
+    batch.add_argument("--length", type=int, help="提取的水印字符数")
+    batch.add_argument("--key", help="块顺序密钥，缺省为原始固定顺序")
+    batch.add_argument("--format", help="输出扩展名，如 png；缺省沿用输入格式")
+    batch.add_argument("--block-size", type=int, default=8)
+    batch.add_argument("--redundancy", type=int, default=3)
+    batch.add_argument("--threshold", type=float, default=1.0)
+    batch.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                       help="工作进程数，0 表示在主进程内处理")
+    batch.add_argument("--checkpoint", help=f"检查点文件，缺省为 <output>/{CHECKPOINT_NAME}")
+    batch.add_argument("--quiet", action="store_true", help="只输出失败的文件")
+    tiled = sub.add_parser("tiled", help="按条带处理内存映射的超大灰度图（PGM 或原始数据）")
+    tiled.add_argument("mode", choices=["embed", "extract"])
+    tiled.add_argument("input")
+    tiled.add_argument("output", nargs="?", help="嵌入结果文件（embed 必需）")
+    tiled.add_argument("--shape", type=int, nargs=2, metavar=("HEIGHT", "WIDTH"),
+                       help="原始 uint8 数据的尺寸；缺省按 PGM 文件头解析")
+    tiled.add_argument("--offset", type=int, default=0, help="原始数据在文件中的起始偏移")
+    tiled.add_argument("--text")
+    tiled.add_argument("--length", type=int)
+    tiled.add_argument("--key", required=True, help="块顺序密钥；原始固定顺序需要在内存中打乱全部块号，不适用于分条处理")
+    tiled.add_argument("--block-size", type=int, default=8)
+    tiled.add_argument("--redundancy", type=int, default=3)
+    tiled.add_argument("--threshold", type=float, default=1.0)
+    tiled.add_argument("--strip-rows", type=int, default=STRIP_ROWS, help="每条的块行数")
+    video = sub.add_parser("video", help="逐帧处理视频，彩色帧嵌入亮度通道")
+    video.add_argument("mode", choices=["embed", "extract"])
+    video.add_argument("input")
+    video.add_argument("output", nargs="?", help="输出视频（embed 必需）")
+    video.add_argument("--text")
+    video.add_argument("--length", type=int)
+    video.add_argument("--key")
+    video.add_argument("--fourcc", default="FFV1", help="输出编码，有损编码需要更大的 --delta")
+    video.add_argument("--block-size", type=int, default=8)
+    video.add_argument("--redundancy", type=int, default=3)
+    video.add_argument("--delta", type=float, default=DELTA)
+    video.add_argument("--threshold", type=float, default=1.0)
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        batch_command(args)
+    elif args.command == "tiled":
+        tiled_command(args)
+    else:
+        if args.mode == "embed" and (args.output is None or args.text is None):
+            sys.exit("video embed requires an output path and --text")
+        if args.mode == "extract" and args.length is None:
+            sys.exit("video extract requires --length")
+        video_command(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -38,13 +38,14 @@ public:
         return digest;
     }
 
-private:
+protected:
     static constexpr size_t BLOCK_SIZE = 64;
     static constexpr size_t DIGEST_SIZE = 32;
 
     // 循环左移
     static uint32_t rotl(uint32_t x, uint32_t n) {
-        return (x << n) | (x >> (32 - n));
+        n &= 31;
+        return n ? (x << n) | (x >> (32 - n)) : x;
     }
 
     // 置换函数P0
@@ -147,6 +148,7 @@ private:
     }
 };
 
+#ifndef SM3_NO_MAIN
 // 辅助函数：将字节数组转换为十六进制字符串
 std::string bytesToHex(const std::vector<uint8_t>& bytes) {
     std::ostringstream oss;
@@ -179,4 +181,5 @@ int main() {
     }
     
     return 0;
-}
\ No newline at end of file
+}
+#endif // SM3_NO_MAIN
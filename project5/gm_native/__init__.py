@@ -0,0 +1,233 @@
+"""SM3/SM4 本地加速层
+
+加载由 build.sh 编译的共享库（复用 project4 的 SM3 与 project1 的 SM4 C++ 实现），
+库不存在时自动回退到 gmssl 的纯 Python 实现，两种后端输出一致。
+可通过环境变量 GM_NATIVE_LIB 指定库路径。
+"""
+import ctypes
+import os
+import sys
+
+from gmssl import sm3 as _gmssl_sm3
+from gmssl import sm4 as _gmssl_sm4
+
+__all__ = ["BACKEND", "SM3", "sm3", "sm4_ecb_encrypt", "sm4_ecb_decrypt", "sm4_ctr"]
+
+
+def _load_library():
+    here = os.path.dirname(os.path.abspath(__file__))
+    if sys.platform == "win32":
+        names = ["gmnative.dll"]
+    elif sys.platform == "darwin":
+        names = ["libgmnative.dylib"]
+    else:
+        names = ["libgmnative.so"]
+    candidates = [os.environ["GM_NATIVE_LIB"]] if os.environ.get("GM_NATIVE_LIB") else []
+    candidates += [os.path.join(here, name) for name in names]
+    for path in candidates:
+        if not os.path.exists(path):
+            continue
+        try:
+            lib = ctypes.CDLL(path)
+        except OSError:
+            continue
+        vp, sz = ctypes.c_void_p, ctypes.c_size_t
+        lib.gm_sm3.argtypes = [vp, sz, vp]
+        lib.gm_sm3.restype = None
+        lib.gm_sm3_compress.argtypes = [ctypes.POINTER(ctypes.c_uint32), vp, sz]
+        lib.gm_sm3_compress.restype = None
+        lib.gm_sm4_ecb.argtypes = [vp, vp, vp, sz, ctypes.c_int]
+        lib.gm_sm4_ecb.restype = ctypes.c_int
+        lib.gm_sm4_ctr.argtypes = [vp, vp, vp, vp, sz]
+        lib.gm_sm4_ctr.restype = ctypes.c_int
+        return lib
+    return None
+
+
+_lib = _load_library()
+BACKEND = "native" if _lib is not None else "gmssl"
+
+
+def _byte_view(data):
+    mv = memoryview(data)
+    if mv.ndim != 1 or mv.itemsize != 1:
+        mv = mv.cast("B")
+    return mv
+
+
+class _PyBuffer(ctypes.Structure):
+    # CPython 的 Py_buffer 结构
+    _fields_ = [("buf", ctypes.c_void_p), ("obj", ctypes.c_void_p), ("len", ctypes.c_ssize_t),
+                ("itemsize", ctypes.c_ssize_t), ("readonly", ctypes.c_int), ("ndim", ctypes.c_int),
+                ("format", ctypes.c_char_p), ("shape", ctypes.c_void_p), ("strides", ctypes.c_void_p),
+                ("suboffsets", ctypes.c_void_p), ("internal", ctypes.c_void_p)]
+
+
+_PyBUF_SIMPLE, _PyBUF_WRITABLE = 0, 1
+ctypes.pythonapi.PyObject_GetBuffer.argtypes = [ctypes.py_object, ctypes.POINTER(_PyBuffer), ctypes.c_int]
+ctypes.pythonapi.PyObject_GetBuffer.restype = ctypes.c_int
+ctypes.pythonapi.PyBuffer_Release.argtypes = [ctypes.POINTER(_PyBuffer)]
+ctypes.pythonapi.PyBuffer_Release.restype = None
+
+
+class _Borrowed:
+    """通过缓冲区协议借用的内存，对象存活期间指针有效，销毁时释放"""
+
+    def __init__(self, data, writable):
+        self.view = _PyBuffer()
+        ctypes.pythonapi.PyObject_GetBuffer(data, ctypes.byref(self.view),
+                                            _PyBUF_WRITABLE if writable else _PyBUF_SIMPLE)
+
+    def __del__(self):
+        ctypes.pythonapi.PyBuffer_Release(ctypes.byref(self.view))
+
+
+def _address(data, writable=False):
+    """返回 (保活对象, 地址, 长度)
+
+    任何 C 连续的缓冲区（bytes、只读 memoryview/mmap、bytearray、numpy 数组等）都直接取内部指针，不复制。
+    writable=True 时只接受可写缓冲区，bytes 等只读对象抛出 TypeError（与 gmssl 后端一致）。
+    """
+    if isinstance(data, bytes) and not writable:
+        ptr = ctypes.c_char_p(data)
+        return ptr, ctypes.cast(ptr, ctypes.c_void_p).value, len(data)
+    mv = _byte_view(data)
+    if writable and mv.readonly:
+        raise TypeError(f"output buffer must be writable, got {type(data).__name__}")
+    if len(mv) == 0:
+        return None, None, 0
+    keep = _Borrowed(mv, writable)
+    return keep, keep.view.buf, keep.view.len
+
+
+def _output(out, n):
+    if out is None:
+        return bytearray(n)
+    view = _byte_view(out)
+    if view.readonly:
+        raise TypeError(f"output buffer must be writable, got {type(out).__name__}")
+    if len(view) < n:
+        raise ValueError("output buffer too small")
+    return out
+
+
+class SM3:
+    """增量 SM3 哈希，接口与 hashlib 对象一致，内存占用与消息长度无关"""
+
+    digest_size = 32
+    block_size = 64
+
+    def __init__(self, data=b""):
+        self._v = (ctypes.c_uint32 * 8)(*_gmssl_sm3.IV) if _lib is not None else list(_gmssl_sm3.IV)
+        self._buf = b""
+        self._length = 0
+        if data:
+            self.update(data)
+
+    def _compress(self, data, start, nblocks):
+        if not nblocks:
+            return
+        if _lib is not None:
+            keep, addr, _ = _address(data)
+            _lib.gm_sm3_compress(self._v, addr + start, nblocks)
+            return
+        mv = _byte_view(data)
+        for i in range(start, start + nblocks * 64, 64):
+            self._v = _gmssl_sm3.sm3_cf(self._v, mv[i:i + 64])
+
+    def update(self, data):
+        mv = _byte_view(data)
+        n = len(mv)
+        self._length += n
+        pos = 0
+        if self._buf:
+            pos = min(64 - len(self._buf), n)
+            self._buf += bytes(mv[:pos])
+            if len(self._buf) < 64:
+                return
+            self._compress(self._buf, 0, 1)
+        nblocks = (n - pos) // 64
+        self._compress(data if pos == 0 else mv[pos:], 0, nblocks)
+        self._buf = bytes(mv[pos + nblocks * 64:])
+
+    def copy(self):
+        h = SM3()
+        h._v = type(self._v)(*self._v) if _lib is not None else list(self._v)
+        h._buf, h._length = self._buf, self._length
+        return h
+
+    def digest(self):
+        h = self.copy()
+        tail = h._buf + b"\x80" + b"\x00" * ((55 - len(h._buf)) % 64) + (h._length * 8).to_bytes(8, "big")
+        h._compress(tail, 0, len(tail) // 64)
+        return b"".join(x.to_bytes(4, "big") for x in h._v)
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+
+def sm3(data):
+    """一次性计算 SM3 摘要（32 字节）"""
+    if _lib is None:
+        return SM3(data).digest()
+    keep, addr, n = _address(data)
+    out = ctypes.create_string_buffer(32)
+    _lib.gm_sm3(addr, n, out)
+    return out.raw
+
+
+def _check_key(key):
+    if len(key) != 16:
+        raise ValueError("SM4 key must be 16 bytes")
+
+
+def _sm4_ecb(key, data, out, encrypt):
+    _check_key(key)
+    n = len(_byte_view(data))
+    if n % 16:
+        raise ValueError("SM4-ECB input length must be a multiple of 16")
+    out = _output(out, n)
+    if _lib is not None:
+        keep_in, addr_in, _ = _address(data)
+        keep_out, addr_out, _ = _address(out, writable=True)
+        if n and _lib.gm_sm4_ecb(bytes(key), addr_in, addr_out, n, 1 if encrypt else 0) != 0:
+            raise ValueError("SM4-ECB failed")
+        return out
+    cipher = _gmssl_sm4.CryptSM4(padding_mode=None)
+    cipher.set_key(bytes(key), _gmssl_sm4.SM4_ENCRYPT if encrypt else _gmssl_sm4.SM4_DECRYPT)
+    _byte_view(out)[:n] = cipher.crypt_ecb(bytes(_byte_view(data)))
+    return out
+
+
+def sm4_ecb_encrypt(key, data, out=None):
+    """SM4-ECB 加密（无填充），data 可为任意支持缓冲区协议的对象，结果写入 out（默认新建 bytearray）"""
+    return _sm4_ecb(key, data, out, True)
+
+
+def sm4_ecb_decrypt(key, data, out=None):
+    """SM4-ECB 解密（无填充）"""
+    return _sm4_ecb(key, data, out, False)
+
+
+def sm4_ctr(key, iv, data, out=None):
+    """SM4-CTR 加解密，iv 为 16 字节初始计数器，按 128 位大端整数递增"""
+    _check_key(key)
+    if len(iv) != 16:
+        raise ValueError("SM4-CTR iv must be 16 bytes")
+    n = len(_byte_view(data))
+    out = _output(out, n)
+    if n == 0:
+        return out
+    if _lib is not None:
+        keep_in, addr_in, _ = _address(data)
+        keep_out, addr_out, _ = _address(out, writable=True)
+        if _lib.gm_sm4_ctr(bytes(key), bytes(iv), addr_in, addr_out, n) != 0:
+            raise ValueError("SM4-CTR failed")
+        return out
+    ctr = int.from_bytes(iv, "big")
+    blocks = (n + 15) // 16
+    counters = b"".join(((ctr + i) % (1 << 128)).to_bytes(16, "big") for i in range(blocks))
+    stream = sm4_ecb_encrypt(key, counters)
+    src = _byte_view(data)
+    _byte_view(out)[:n] = (int.from_bytes(src, "big") ^ int.from_bytes(stream[:n], "big")).to_bytes(n, "big")
+    return out
@@ -0,0 +1,17 @@
+#!/bin/bash
+# 编译 SM3/SM4 本地加速库，输出到本目录供 gm_native 加载
+set -e
+cd "$(dirname "$0")"
+
+case "$(uname -s)" in
+    Darwin) OUT=libgmnative.dylib ;;
+    MINGW*|MSYS*|CYGWIN*) OUT=gmnative.dll ;;
+    *) OUT=libgmnative.so ;;
+esac
+
+${CXX:-g++} -O3 -std=c++17 -shared -fPIC \
+    -I../../project1/include \
+    gm_native.cpp ../../project1/src/SM4.cpp \
+    -o "$OUT"
+
+echo "built $OUT"
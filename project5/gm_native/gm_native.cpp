@@ -0,0 +1,96 @@
+/**
+ * @file gm_native.cpp
+ * @brief SM3/SM4 的 C ABI 导出层，供 Python 通过 ctypes 调用
+ *
+ * SM3 复用 project4/SM3_.cpp，SM4 复用 project1/src/SM4.cpp，
+ * 这里只负责把 C++ 类包装成无异常、按指针读写缓冲区的 C 函数。
+ */
+
+#define SM3_NO_MAIN
+#include "../../project4/SM3_.cpp"
+#include "SM4.h"
+
+#include <cstddef>
+#include <cstdint>
+#include <cstring>
+
+namespace {
+
+// 暴露 SM3 的压缩函数，供增量哈希使用
+struct SM3Core : SM3 {
+    using SM3::compress;
+};
+
+const size_t CTR_BATCH = 4096;  // CTR 模式每次加密的计数器块数
+
+void increment_counter(uint8_t ctr[16]) {
+    for (int i = 15; i >= 0; --i) {
+        if (++ctr[i] != 0) {
+            break;
+        }
+    }
+}
+
+}  // namespace
+
+extern "C" {
+
+/** 一次性计算 SM3 摘要，out 至少 32 字节 */
+void gm_sm3(const uint8_t* data, size_t len, uint8_t* out) {
+    SM3 sm3;
+    std::vector<uint8_t> digest = sm3.hash(data, len);
+    std::memcpy(out, digest.data(), digest.size());
+}
+
+/** 对 nblocks 个 64 字节分组依次调用压缩函数，state 为 8 个 32 位字 */
+void gm_sm3_compress(uint32_t* state, const uint8_t* blocks, size_t nblocks) {
+    static const SM3Core core;
+    std::array<uint32_t, 8> V;
+    std::memcpy(V.data(), state, sizeof(V));
+    for (size_t i = 0; i < nblocks; ++i) {
+        core.compress(V, blocks + i * 64);
+    }
+    std::memcpy(state, V.data(), sizeof(V));
+}
+
+/** SM4-ECB，len 必须是 16 的倍数，in 与 out 可以相同（原地加解密）；成功返回 0 */
+int gm_sm4_ecb(const uint8_t* key, const uint8_t* in, uint8_t* out, size_t len, int encrypt) {
+    if (len % 16 != 0) {
+        return -1;
+    }
+    try {
+        SM4 sm4(std::vector<uint8_t>(key, key + 16));
+        sm4.cryptBlocks(in, out, len, encrypt != 0);
+    } catch (...) {
+        return -1;
+    }
+    return 0;
+}
+
+/** SM4-CTR，iv 为 16 字节初始计数器（大端递增），加解密相同，in 与 out 可以相同；成功返回 0 */
+int gm_sm4_ctr(const uint8_t* key, const uint8_t* iv, const uint8_t* in, uint8_t* out, size_t len) {
+    try {
+        SM4 sm4(std::vector<uint8_t>(key, key + 16));
+        uint8_t ctr[16];
+        std::memcpy(ctr, iv, 16);
+        // 只有密钥流用固定大小的缓冲区，输入输出直接按指针读写
+        std::vector<uint8_t> stream(CTR_BATCH * 16);
+        for (size_t pos = 0; pos < len; pos += CTR_BATCH * 16) {
+            size_t n = len - pos < CTR_BATCH * 16 ? len - pos : CTR_BATCH * 16;
+            size_t blocks = (n + 15) / 16;
+            for (size_t b = 0; b < blocks; ++b) {
+                std::memcpy(&stream[b * 16], ctr, 16);
+                increment_counter(ctr);
+            }
+            sm4.cryptBlocks(stream.data(), stream.data(), blocks * 16, true);
+            for (size_t i = 0; i < n; ++i) {
+                out[pos + i] = in[pos + i] ^ stream[i];
+            }
+        }
+    } catch (...) {
+        return -1;
+    }
+    return 0;
+}
+
+}  // extern "C"
@@ -0,0 +1,186 @@
+"""SM2 基准测试：对比 sm2_basic 与 sm2_optimized
+
+覆盖密钥生成、签名、验签、固定基/变基点乘和哈希。每项先预热，再重复多轮、
+逐次计时，报告中位数、p95 与 ops/s。结果可输出为 JSON 供 CI 跟踪回归，
+--profile 时用 cProfile 采样并输出热点函数。
+
+    python sm2_bench.py --json bench.json
+    python sm2_bench.py --impl optimized --ops sign verify --profile sm2.pstats
+"""
+import argparse
+import cProfile
+import json
+import os
+import platform
+import pstats
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+
+import gm_native
+import sm2_basic
+import sm2_optimized
+
+# verify 的公钥在预热后进入 SM2.point_cache（常见的同一公钥反复验签）；verify_cold 与
+# ec_mult_var 绕过该缓存，对应首次出现的公钥和真正的变基点乘
+OPS = ["keygen", "sign", "verify", "verify_cold", "ec_mult_fixed", "ec_mult_var", "hash"]
+MESSAGE = b"Hello SM2 Digital Signature" * 4
+
+
+def _random_scalar():
+    return secrets.randbelow(sm2_optimized.SM2.N - 1) + 1
+
+
+def _without_point_cache(func):
+    """调用期间关闭 sm2_optimized 的公钥预计算表缓存"""
+    def call(*args):
+        cache, sm2_optimized.SM2.point_cache = sm2_optimized.SM2.point_cache, None
+        try:
+            return func(*args)
+        finally:
+            sm2_optimized.SM2.point_cache = cache
+    return call
+
+
+def make_cases(impl):
+    """返回 {操作名: 无参可调用对象}，密钥与签名等输入在计时前准备好"""
+    if impl == "basic":
+        cls = sm2_basic.SM2
+        fixed_mult = lambda k: cls.ec_mult(k, cls.G, cls.P)
+        var_mult = lambda k, Q: cls.ec_mult(k, Q, cls.P)
+    else:
+        cls = sm2_optimized.SM2
+        fixed_mult = cls.mul_base
+        var_mult = _without_point_cache(cls.ec_mult)
+
+    signer = cls()
+    signer.generate_key_pair()
+    signature = signer.sign(MESSAGE)
+    Q = signer.public_key
+
+    return {
+        "keygen": lambda: cls().generate_key_pair(),
+        "sign": lambda: signer.sign(MESSAGE),
+        "verify": lambda: signer.verify(MESSAGE, signature),
+        "verify_cold": _without_point_cache(lambda: signer.verify(MESSAGE, signature)),
+        "ec_mult_fixed": lambda: fixed_mult(_random_scalar()),
+        "ec_mult_var": lambda: var_mult(_random_scalar(), Q),
+        "hash": lambda: cls._hash_message(MESSAGE),
+    }
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def measure(func, iterations, warmup, repeat):
+    """逐次计时：warmup 次预热后重复 repeat 轮，每轮 iterations 次"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+    median = statistics.median(samples)
+    return {
+        "samples": len(samples),
+        "mean_s": statistics.fmean(samples),
+        "median_s": median,
+        "p95_s": _percentile(samples, 0.95),
+        "min_s": min(samples),
+        "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "ops_per_s": 1.0 / median if median > 0 else float("inf"),
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(impls, ops, iterations, warmup, repeat, out=sys.stdout):
+    results = []
+    for impl in impls:
+        cases = make_cases(impl)
+        for op in ops:
+            stats = measure(cases[op], iterations, warmup, repeat)
+            results.append(dict(impl=impl, op=op, **stats))
+            print(f"{impl:>9} {op:<14} median {stats['median_s'] * 1e3:9.3f} ms  "
+                  f"p95 {stats['p95_s'] * 1e3:9.3f} ms  {stats['ops_per_s']:10.1f} ops/s",
+                  file=out, flush=True)
+    return results
+
+
+def profile(impls, ops, iterations, path, top):
+    """在 cProfile 下运行各操作，保存 pstats 并打印累计耗时最高的函数"""
+    profiler = cProfile.Profile()
+    for impl in impls:
+        cases = make_cases(impl)
+        profiler.enable()
+        for op in ops:
+            for _ in range(iterations):
+                cases[op]()
+        profiler.disable()
+    if path:
+        profiler.dump_stats(path)
+        print(f"pstats written to {path}")
+    stats = pstats.Stats(profiler).strip_dirs().sort_stats("cumulative")
+    stats.print_stats(top)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SM2 basic/optimized benchmark")
+    parser.add_argument("--impl", choices=["basic", "optimized", "both"], default="both")
+    parser.add_argument("--ops", nargs="+", choices=OPS, default=OPS)
+    parser.add_argument("--iterations", type=int, default=20, help="每轮计时次数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复轮数")
+    parser.add_argument("--warmup", type=int, default=3, help="预热次数（含预计算表构建）")
+    parser.add_argument("--json", metavar="PATH", help="将结果写入 JSON 文件，'-' 为标准输出")
+    parser.add_argument("--profile", nargs="?", const="", metavar="PSTATS",
+                        help="用 cProfile 运行并打印热点函数，可指定 pstats 输出文件")
+    parser.add_argument("--top", type=int, default=25, help="--profile 时打印的函数数")
+    args = parser.parse_args(argv)
+
+    impls = ["basic", "optimized"] if args.impl == "both" else [args.impl]
+
+    if args.profile is not None:
+        profile(impls, args.ops, args.iterations, args.profile, args.top)
+        return
+
+    results = run(impls, args.ops, args.iterations, args.warmup, args.repeat,
+                  out=sys.stderr if args.json == "-" else sys.stdout)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "hash_backend": gm_native.BACKEND,
+            "iterations": args.iterations,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""可选的性能计数层
+
+关闭时不做任何改动，热路径上没有额外开销；enable() 时才把 SM2 的点运算、求逆、点乘、
+签名/验签等静态方法和实例方法替换为计数或计时的包装函数，disable() 原样恢复。
+SM2 内部调用都经过 SM2.xxx 属性查找，替换类属性即可覆盖所有调用路径。
+
+    with instrumented() as metrics:
+        sm2.sign(b"msg")
+    print(export())
+
+计数器记录调用次数；域乘法次数按各公式的乘法/平方个数估计（见 FIELD_MUL_COST），
+求逆单独计数。延迟直方图按 2 的幂划分桶（1 µs 起），快照给出近似分位数。
+其他模块可以用 register() 登记自己的插桩函数（如 project6/psi_metrics.py），随 enable() 一起生效。
+注意插桩只在当前进程生效，进程池中的工作进程不计入。
+"""
+import bisect
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from sm2_optimized import SM2
+
+# 每次运算的域乘法（含平方）估计值，a = -3 的点加倍公式为 4M + 4S
+FIELD_MUL_COST = {
+    "sm2.point_double": 8,
+    "sm2.point_add_mixed": 11,  # Z2 = 1 的混合坐标加法
+    "sm2.point_add": 16,
+    "sm2.to_affine": 4,
+    "sm2.batch_to_affine.points": 7,  # 每点：前缀积 1 次，回代 6 次
+}
+
+_BUCKETS = [2.0 ** i * 1e-6 for i in range(28)]  # 1 µs ~ 134 s
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """按桶上界估计分位数"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(_BUCKETS + [self.max], self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "sum": self.total, "mean": self.total / self.count,
+                "min": self.min, "max": self.max,
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99),
+                "buckets": {f"{bound:.6g}": n for bound, n in zip(_BUCKETS + [float("inf")], self.counts) if n}}
+
+
+class Metrics:
+    """计数器与延迟直方图，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = defaultdict(int)
+            self.histograms = defaultdict(Histogram)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: h.snapshot() for name, h in self.histograms.items()}
+        estimate = sum(counters.get(name, 0) * cost for name, cost in FIELD_MUL_COST.items())
+        derived = {"sm2.field_mul_estimate": estimate} if estimate else {}
+        return {"enabled": is_enabled(), "counters": counters, "histograms": histograms, "derived": derived}
+
+
+METRICS = Metrics()
+
+_patches = []
+_instrumenters = []
+_depth = 0
+_state_lock = threading.Lock()
+
+
+def patch(owner, name, make):
+    """用 make(原函数) 替换 owner.name，staticmethod 保持为 staticmethod，disable() 时恢复"""
+    original = owner.__dict__[name]
+    is_static = isinstance(original, staticmethod)
+    wrapper = wraps(original.__func__ if is_static else original)(make(original.__func__ if is_static else original))
+    setattr(owner, name, staticmethod(wrapper) if is_static else wrapper)
+    _patches.append((owner, name, original))
+
+
+def counting(name, size=None):
+    """计数包装；size(args) 给出本次调用计入的数量，缺省为 1"""
+    def make(func):
+        def wrapper(*args, **kwargs):
+            METRICS.count(name, 1 if size is None else size(args))
+            return func(*args, **kwargs)
+        return wrapper
+    return make
+
+
+def timing(name):
+    """计时包装，调用次数即直方图的 count"""
+    def make(func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+        return wrapper
+    return make
+
+
+def _count_add(func):
+    def jacobian_add(X1, Y1, Z1, X2, Y2, Z2):
+        METRICS.count("sm2.point_add_mixed" if Z2 == 1 else "sm2.point_add")
+        return func(X1, Y1, Z1, X2, Y2, Z2)
+    return jacobian_add
+
+
+def _instrument_sm2():
+    patch(SM2, "jacobian_double", counting("sm2.point_double"))
+    patch(SM2, "jacobian_add", _count_add)
+    patch(SM2, "inv_mod", counting("sm2.inversion"))
+    patch(SM2, "jacobian_to_affine", counting("sm2.to_affine"))
+    patch(SM2, "batch_to_affine", counting("sm2.batch_to_affine.points", lambda args: len(args[0])))
+    patch(SM2, "_fixed_mul_jacobian", counting("sm2.fixed_base_mult"))
+    patch(SM2, "_wnaf_mul_jacobian", counting("sm2.wnaf_mult", lambda args: len(args[0])))
+    patch(SM2, "_hash_message", timing("sm2.hash"))
+    patch(SM2, "_hash_stream", timing("sm2.hash"))
+    patch(SM2, "sign", timing("sm2.sign"))
+    patch(SM2, "sign_many", timing("sm2.sign_many"))
+    patch(SM2, "verify", timing("sm2.verify"))
+    patch(SM2, "verify_batch", timing("sm2.verify_batch"))
+
+
+def register(instrumenter):
+    """登记额外的插桩函数，在 enable() 时调用；已开启时立即生效"""
+    with _state_lock:
+        _instrumenters.append(instrumenter)
+        if _depth:
+            instrumenter()
+
+
+def enable():
+    """开启插桩；可嵌套调用，与 disable() 成对使用"""
+    global _depth
+    with _state_lock:
+        if _depth == 0:
+            for instrumenter in [_instrument_sm2] + _instrumenters:
+                instrumenter()
+        _depth += 1
+
+
+def disable():
+    global _depth
+    with _state_lock:
+        if _depth == 0:
+            return
+        _depth -= 1
+        if _depth == 0:
+            while _patches:
+                owner, name, original = _patches.pop()
+                setattr(owner, name, original)
+
+
+def is_enabled():
+    return _depth > 0
+
+
+@contextmanager
+def instrumented(reset=True):
+    """在 with 块内开启插桩，产出 METRICS"""
+    if reset:
+        METRICS.reset()
+    enable()
+    try:
+        yield METRICS
+    finally:
+        disable()
+
+
+def timed(name):
+    """装饰器：插桩开启时记录被装饰函数的延迟，关闭时只多一次状态判断"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _depth:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    return METRICS.snapshot()
+
+
+def export(path=None, fmt="json"):
+    """导出快照为 JSON 或 Prometheus 文本格式；给出 path 时写入文件，否则返回字符串"""
+    snap = snapshot()
+    if fmt == "json":
+        text = json.dumps(snap, indent=2, sort_keys=True)
+    elif fmt == "prometheus":
+        lines = []
+        for name, value in sorted({**snap["counters"], **snap["derived"]}.items()):
+            lines.append(f"{_metric_name(name)}_total {value}")
+        for name, h in sorted(snap["histograms"].items()):
+            metric = _metric_name(name) + "_seconds"
+            if h["count"]:
+                for q in ("p50", "p90", "p99"):
+                    lines.append(f'{metric}{{quantile="0.{q[1:]}"}} {h[q]:.9g}')
+                lines.append(f"{metric}_sum {h['sum']:.9g}")
+            lines.append(f"{metric}_count {h['count']}")
+        text = "\n".join(lines) + "\n"
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
+    if path is None:
+        return text
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def _metric_name(name):
+    return name.replace(".", "_")
@@ -1,5 +1,15 @@
+import mmap
+import multiprocessing
+import os
 import secrets
-from gmssl import sm3, func
+import sys
+import threading
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
+from gm_native import SM3 as SM3Hash
 
 class SM2:
     # SM2参数（国密标准）
@@ -13,55 +23,60 @@ class SM2:
 
     @staticmethod
     def inv_mod(a, p):
-        """扩展欧几里得求逆元"""
+        """模逆，使用内置pow(a, -1, p)（C实现的扩展欧几里得）"""
+        a %= p
         if a == 0:
             return 0
-        lm, hm = 1, 0
-        low, high = a % p, p
-        while low > 1:
-            r = high // low
-            nm, new = hm - lm * r, high - low * r
-            lm, low, hm, high = nm, new, lm, low
-        return lm % p
+        return pow(a, -1, p)
 
     @staticmethod
     def jacobian_double(X1, Y1, Z1):
-        """Jacobian坐标点加倍"""
-        if Y1 == 0:
+        """Jacobian坐标点加倍
+
+        SM2曲线 a = -3，故 3X^2 + aZ^4 = 3(X - Z^2)(X + Z^2)，省去Z^4的计算。
+        """
+        if Y1 == 0 or Z1 == 0:
             return (0, 0, 0)
-        P, A = SM2.P, SM2.A
-        S = (4 * X1 * Y1 * Y1) % P
-        M = (3 * X1 * X1 + A * Z1 * Z1 * Z1 * Z1) % P
-        X3 = (M * M - 2 * S) % P
-        Y3 = (M * (S - X3) - 8 * Y1 * Y1 * Y1 * Y1) % P
-        Z3 = (2 * Y1 * Z1) % P
+        P = SM2.P
+        delta = Z1 * Z1 % P
+        gamma = Y1 * Y1 % P
+        beta = X1 * gamma % P
+        alpha = 3 * (X1 - delta) * (X1 + delta) % P
+        X3 = (alpha * alpha - 8 * beta) % P
+        Y3 = (alpha * (4 * beta - X3) - 8 * gamma * gamma) % P
+        Z3 = 2 * Y1 * Z1 % P
         return (X3, Y3, Z3)
 
     @staticmethod
     def jacobian_add(X1, Y1, Z1, X2, Y2, Z2):
-        """Jacobian坐标点加法"""
-        P = SM2.P
+        """Jacobian坐标点加法，Z2 = 1（预计算表中的仿射点）时使用混合坐标加法"""
         if Z1 == 0:
             return (X2, Y2, Z2)
         if Z2 == 0:
             return (X1, Y1, Z1)
-        U1 = (X1 * Z2 * Z2) % P
-        U2 = (X2 * Z1 * Z1) % P
-        S1 = (Y1 * Z2 * Z2 * Z2) % P
-        S2 = (Y2 * Z1 * Z1 * Z1) % P
+        P = SM2.P
+        Z1Z1 = Z1 * Z1 % P
+        U2 = X2 * Z1Z1 % P
+        S2 = Y2 * Z1 * Z1Z1 % P
+        if Z2 == 1:
+            U1, S1 = X1, Y1
+        else:
+            Z2Z2 = Z2 * Z2 % P
+            U1 = X1 * Z2Z2 % P
+            S1 = Y1 * Z2 * Z2Z2 % P
         if U1 == U2:
             if S1 != S2:
-                return (0, 0, 1)  # 无穷远点
+                return (0, 0, 0)  # 无穷远点
             else:
                 return SM2.jacobian_double(X1, Y1, Z1)
         H = (U2 - U1) % P
         R = (S2 - S1) % P
-        H2 = (H * H) % P
-        H3 = (H * H2) % P
-        U1H2 = (U1 * H2) % P
+        H2 = H * H % P
+        H3 = H * H2 % P
+        U1H2 = U1 * H2 % P
         X3 = (R * R - H3 - 2 * U1H2) % P
         Y3 = (R * (U1H2 - X3) - S1 * H3) % P
-        Z3 = (H * Z1 * Z2) % P
+        Z3 = H * Z1 % P if Z2 == 1 else H * Z1 * Z2 % P
         return (X3, Y3, Z3)
 
     @staticmethod
@@ -77,49 +92,291 @@ class SM2:
         y = (Y * Z_inv3) % P
         return (x, y)
 
+    @staticmethod
+    def batch_to_affine(points):
+        """批量转换为仿射坐标：Montgomery同时求逆，N个点只做一次模逆和约3N次乘法
+
+        无穷远点（Z=0）转换为 (0, 0)，与 jacobian_to_affine 一致。
+        """
+        P = SM2.P
+        prefix = []  # prefix[i] = Z_0 * ... * Z_{i-1}（跳过Z=0）
+        acc = 1
+        for _, _, Z in points:
+            prefix.append(acc)
+            if Z:
+                acc = acc * Z % P
+        inv = SM2.inv_mod(acc, P)
+        result = [(0, 0)] * len(prefix)
+        for i in range(len(prefix) - 1, -1, -1):
+            X, Y, Z = points[i]
+            if not Z:
+                continue
+            Z_inv = inv * prefix[i] % P
+            inv = inv * Z % P
+            Z_inv2 = Z_inv * Z_inv % P
+            result[i] = (X * Z_inv2 % P, Y * Z_inv2 * Z_inv % P)
+        return result
+
     @staticmethod
     def ec_mult(k, point):
-        """Jacobian坐标快速点乘"""
-        X1, Y1 = point
-        X, Y, Z = 0, 0, 0  # Jacobian无穷远点
-        X2, Y2, Z2 = X1, Y1, 1
-        while k > 0:
+        """Jacobian坐标快速点乘：有缓存的固定基表时直接查表，否则使用wNAF"""
+        return SM2.jacobian_to_affine(*SM2._mul_jacobian(((k, point),)))
+
+    # 基点G的固定基窗口宽度（位），预计算表在首次使用时构建
+    BASE_WINDOW = 4
+    _base_table = None
+
+    @staticmethod
+    def _build_fixed_table(point, w):
+        """构建点的固定基预计算表: table[i][j] = [j * 2^(w*i)]P
+
+        表项最后统一批量转为仿射坐标 (x, y, 1)，点加时走混合坐标快速路径。
+        """
+        windows = (SM2.N.bit_length() + w - 1) // w
+        table = []
+        X, Y, Z = point[0], point[1], 1  # 当前窗口的基 [2^(w*i)]P
+        for _ in range(windows):
+            acc = (X, Y, Z)
+            row = [(0, 0, 0), acc]
+            for _ in range(2, 1 << w):
+                acc = SM2.jacobian_add(*acc, X, Y, Z)
+                row.append(acc)
+            table.append(row)
+            # 下一个窗口的基: (2^w - 1)B + B = [2^w]B
+            X, Y, Z = SM2.jacobian_add(*acc, X, Y, Z)
+        affine = iter(SM2.batch_to_affine([p for row in table for p in row[1:]]))
+        return [[(0, 0, 0)] + [next(affine) + (1,) for _ in row[1:]] for row in table]
+
+    @staticmethod
+    def _build_base_table():
+        """构建G的固定基预计算表"""
+        return SM2._build_fixed_table(SM2.G, SM2.BASE_WINDOW)
+
+    @staticmethod
+    def _fixed_mul_jacobian(k, table, w, X=0, Y=0, Z=0):
+        """用固定基表计算 [k]P 并累加到Jacobian点 (X, Y, Z) 上"""
+        k %= SM2.N
+        mask = (1 << w) - 1
+        i = 0
+        while k:
+            d = k & mask
+            if d:
+                X, Y, Z = SM2.jacobian_add(X, Y, Z, *table[i][d])
+            k >>= w
+            i += 1
+        return (X, Y, Z)
+
+    @staticmethod
+    def mul_base(k):
+        """基点G的固定基快速点乘 [k]G，每个窗口只需一次查表和点加，无需点倍"""
+        table, w = SM2._fixed_table(SM2.G)
+        return SM2.jacobian_to_affine(*SM2._fixed_mul_jacobian(k, table, w))
+
+    @staticmethod
+    def _fixed_table(point):
+        """返回点的固定基表及窗口宽度：G使用常驻表，其余点查LRU缓存，缓存关闭时返回None"""
+        if point == SM2.G:
+            if SM2._base_table is None:
+                SM2._base_table = SM2._build_base_table()
+            return SM2._base_table, SM2.BASE_WINDOW
+        if SM2.point_cache is not None:
+            table = SM2.point_cache.get(point)
+            if table is not None:
+                return table, SM2.point_cache.window
+        return None
+
+    # wNAF窗口宽度：变基点用较窄窗口，基点G的奇数倍表只构建一次，可用更宽窗口
+    NAF_WINDOW = 5
+    BASE_NAF_WINDOW = 7
+    _base_naf_table = None
+
+    @staticmethod
+    def _wnaf(k, w):
+        """宽度为w的NAF重编码，返回由低位到高位的有符号数字列表"""
+        digits = []
+        half, full = 1 << (w - 1), 1 << w
+        while k:
             if k & 1:
-                if Z == 0:
-                    X, Y, Z = X2, Y2, Z2
-                else:
-                    X, Y, Z = SM2.jacobian_add(X, Y, Z, X2, Y2, Z2)
-            X2, Y2, Z2 = SM2.jacobian_double(X2, Y2, Z2)
+                d = k & (full - 1)
+                if d >= half:
+                    d -= full
+                k -= d
+            else:
+                d = 0
+            digits.append(d)
             k >>= 1
-        return SM2.jacobian_to_affine(X, Y, Z)
+        return digits
+
+    @staticmethod
+    def _odd_multiples(point, w):
+        """预计算奇数倍点 [1]P, [3]P, ..., [2^(w-1)-1]P，批量转为仿射坐标 (x, y, 1)"""
+        x, y = point
+        table = [(x, y, 1)]
+        X2, Y2, Z2 = SM2.jacobian_double(x, y, 1)
+        for _ in range((1 << (w - 2)) - 1):
+            table.append(SM2.jacobian_add(*table[-1], X2, Y2, Z2))
+        return [p + (1,) for p in SM2.batch_to_affine(table)]
+
+    @staticmethod
+    def _naf_table(point):
+        """返回点的wNAF窗口宽度及奇数倍预计算表，G的表缓存复用"""
+        if point == SM2.G:
+            if SM2._base_naf_table is None:
+                SM2._base_naf_table = SM2._odd_multiples(SM2.G, SM2.BASE_NAF_WINDOW)
+            return SM2.BASE_NAF_WINDOW, SM2._base_naf_table
+        return SM2.NAF_WINDOW, SM2._odd_multiples(point, SM2.NAF_WINDOW)
+
+    @staticmethod
+    def multi_mul(k1, point1, k2, point2):
+        """Shamir/Straus联合点乘 [k1]P1 + [k2]P2
+
+        两点都有固定基表（G或缓存命中的公钥）时直接查表累加；否则两个标量经wNAF
+        重编码后共享同一条点倍链。全程Jacobian坐标，最后只做一次模逆。
+        """
+        return SM2.jacobian_to_affine(*SM2._mul_jacobian(((k1, point1), (k2, point2))))
+
+    @staticmethod
+    def _mul_jacobian(terms):
+        """计算 Σ[k_i]P_i：所有点都有固定基表时逐表累加，否则走wNAF联合点乘"""
+        fixed = [SM2._fixed_table(point) for _, point in terms]
+        if any(entry is None for entry in fixed):
+            return SM2._wnaf_mul_jacobian(terms)
+        X, Y, Z = 0, 0, 0
+        for (k, _), (table, w) in zip(terms, fixed):
+            X, Y, Z = SM2._fixed_mul_jacobian(k, table, w, X, Y, Z)
+        return (X, Y, Z)
+
+    @staticmethod
+    def _wnaf_mul_jacobian(terms):
+        """多标量wNAF点乘 Σ[k_i]P_i，terms为(k, point)序列，结果保持Jacobian坐标"""
+        P = SM2.P
+        nafs, tables = [], []
+        for k, point in terms:
+            w, table = SM2._naf_table(point)
+            nafs.append(SM2._wnaf(k % SM2.N, w))
+            tables.append(table)
+        X, Y, Z = 0, 0, 0  # Jacobian无穷远点
+        for i in range(max(len(naf) for naf in nafs) - 1, -1, -1):
+            if Z != 0:
+                X, Y, Z = SM2.jacobian_double(X, Y, Z)
+            for naf, table in zip(nafs, tables):
+                if i >= len(naf) or naf[i] == 0:
+                    continue
+                d = naf[i]
+                if d > 0:
+                    QX, QY, QZ = table[d >> 1]
+                else:
+                    QX, QY, QZ = table[(-d) >> 1]
+                    QY = P - QY  # 负点: (X, -Y, Z)
+                X, Y, Z = SM2.jacobian_add(X, Y, Z, QX, QY, QZ)
+        return (X, Y, Z)
 
     @staticmethod
     def _hash_message(message: bytes) -> int:
-        digest = sm3.sm3_hash(func.bytes_to_list(message))
-        return int(digest, 16) % SM2.N
+        return int.from_bytes(SM3Hash(message).digest(), "big") % SM2.N
+
+    # 默认用户身份标识（GB/T 32918）
+    DEFAULT_ID = b"1234567812345678"
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def compute_za(public_key, user_id=DEFAULT_ID):
+        """ZA = SM3(ENTL || ID || a || b || xG || yG || xA || yA)，按公钥缓存"""
+        h = SM3Hash((len(user_id) * 8).to_bytes(2, "big"))
+        h.update(user_id)
+        for v in (SM2.A, SM2.B, SM2.Gx, SM2.Gy, public_key[0], public_key[1]):
+            h.update(v.to_bytes(32, "big"))
+        return h.digest()
+
+    @staticmethod
+    def _hash_stream(public_key, stream, user_id, chunk_size):
+        """e = SM3(ZA || M)，消息按块增量哈希，内存占用与消息大小无关"""
+        h = SM3Hash(SM2.compute_za(public_key, user_id))
+        for chunk in _iter_chunks(stream, chunk_size):
+            h.update(chunk)
+        return int.from_bytes(h.digest(), "big") % SM2.N
 
     def __init__(self):
         self.private_key = None
         self.public_key = None
+        self.sign_pool = None
+
+    def enable_sign_pool(self, depth=256, low_watermark=64):
+        """开启签名预计算池，由后台线程预先计算 (k, x1)"""
+        self.disable_sign_pool()
+        self.sign_pool = SignPool(depth, low_watermark)
+        return self.sign_pool
+
+    def disable_sign_pool(self):
+        if self.sign_pool is not None:
+            self.sign_pool.close()
+            self.sign_pool = None
 
     def generate_key_pair(self):
         self.private_key = secrets.randbelow(SM2.N - 1) + 1
-        self.public_key = SM2.ec_mult(self.private_key, SM2.G)
+        self.public_key = SM2.mul_base(self.private_key)
         return self.private_key, self.public_key
 
+    @staticmethod
+    def generate_key_pairs(n):
+        """批量生成n个密钥对 [(d, P), ...]，公钥统一做一次批量求逆"""
+        table, w = SM2._fixed_table(SM2.G)
+        keys = [secrets.randbelow(SM2.N - 1) + 1 for _ in range(n)]
+        points = SM2.batch_to_affine([SM2._fixed_mul_jacobian(d, table, w) for d in keys])
+        return list(zip(keys, points))
+
+    @staticmethod
+    def _new_nonce():
+        """生成签名随机数k及 [k]G 的x坐标"""
+        k = secrets.randbelow(SM2.N - 1) + 1
+        x1, y1 = SM2.mul_base(k)
+        return k, x1
+
+    @staticmethod
+    def _new_nonces(n):
+        """批量生成n个 (k, x1)"""
+        return [(k, point[0]) for k, point in SM2.generate_key_pairs(n)]
+
     def sign(self, message: bytes):
         if self.private_key is None:
             raise ValueError("Private key not set")
 
-        e = self._hash_message(message)
+        return self._sign_digest(self._hash_message(message))
+
+    def sign_stream(self, stream, user_id=DEFAULT_ID, chunk_size=1 << 20):
+        """对大消息签名：stream可以是文件对象、mmap/bytes等缓冲区或字节块迭代器，摘要含ZA前缀"""
+        if self.private_key is None:
+            raise ValueError("Private key not set")
+        return self._sign_digest(SM2._hash_stream(self.public_key, stream, user_id, chunk_size))
+
+    def sign_many(self, messages):
+        """批量签名，返回与messages顺序一致的签名列表
+
+        未开启签名池时，所有随机点 [k]G 一起做一次批量求逆。
+        """
+        if self.private_key is None:
+            raise ValueError("Private key not set")
+        digests = [SM2._hash_message(message) for message in messages]
+        if self.sign_pool is not None:
+            return [self._sign_digest(e) for e in digests]
+        inv_1_d = SM2.inv_mod(1 + self.private_key, SM2.N)
+        nonces = SM2._new_nonces(len(digests))
+        return [self._sign_digest(e, inv_1_d, nonce) for e, nonce in zip(digests, nonces)]
+
+    def _sign_digest(self, e, inv_1_d=None, nonce=None):
         if e == 0:
             e = 1
 
-        inv_1_d = SM2.inv_mod(1 + self.private_key, SM2.N)  # 预计算，提高效率
+        if inv_1_d is None:
+            inv_1_d = SM2.inv_mod(1 + self.private_key, SM2.N)  # 预计算，提高效率
 
         while True:
-            k = secrets.randbelow(SM2.N - 1) + 1
-            x1, y1 = SM2.ec_mult(k, SM2.G)
+            if nonce is not None:
+                (k, x1), nonce = nonce, None
+            elif self.sign_pool is not None:
+                k, x1 = self.sign_pool.pop()
+            else:
+                k, x1 = SM2._new_nonce()
             r = (e + x1) % SM2.N
             if r == 0 or r + k == SM2.N:
                 continue
@@ -131,12 +388,26 @@ class SM2:
     def verify(self, message: bytes, signature):
         if self.public_key is None:
             raise ValueError("Public key not set")
+        return SM2._verify_with(self.public_key, message, signature)
+
+    def verify_stream(self, stream, signature, user_id=DEFAULT_ID, chunk_size=1 << 20):
+        """验证 sign_stream 产生的签名"""
+        if self.public_key is None:
+            raise ValueError("Public key not set")
+        e = SM2._hash_stream(self.public_key, stream, user_id, chunk_size)
+        return SM2._verify_digest(self.public_key, e, signature)
 
+    @staticmethod
+    def _verify_with(public_key, message: bytes, signature, projective=False):
+        """使用给定公钥验签；projective=True时在Jacobian坐标下直接比较x坐标，省去模逆"""
+        return SM2._verify_digest(public_key, SM2._hash_message(message), signature, projective)
+
+    @staticmethod
+    def _verify_digest(public_key, e, signature, projective=False):
         r, s = signature
         if not (1 <= r < SM2.N and 1 <= s < SM2.N):
             return False
 
-        e = self._hash_message(message)
         if e == 0:
             e = 1
 
@@ -144,11 +415,56 @@ class SM2:
         if t == 0:
             return False
 
-        sg = SM2.ec_mult(s, SM2.G)
-        tp = SM2.ec_mult(t, self.public_key)
-        x1, y1 = SM2.ec_add(sg, tp)
-        R = (e + x1) % SM2.N
-        return R == r
+        if not projective:
+            x1, y1 = SM2.multi_mul(s, SM2.G, t, public_key)
+            R = (e + x1) % SM2.N
+            return R == r
+
+        # (e + x1) mod n == r  <=>  x1 ∈ {r - e mod n, r - e mod n + n}，且 x1 = X / Z^2
+        X, Y, Z = SM2._mul_jacobian(((s, SM2.G), (t, public_key)))
+        if Z == 0:
+            return (e % SM2.N) == r
+        Z2 = (Z * Z) % SM2.P
+        x = (r - e) % SM2.N
+        while x < SM2.P:
+            if (x * Z2 - X) % SM2.P == 0:
+                return True
+            x += SM2.N
+        return False
+
+    @staticmethod
+    def verify_batch(items, workers=None, chunksize=64, all_valid=False):
+        """批量验签
+
+        :param items: (public_key, message, signature) 三元组的可迭代对象
+        :param workers: 进程数，None为CPU核数，<=1时在当前进程中串行执行
+        :param chunksize: 每个任务包含的签名数
+        :param all_valid: True时只返回是否全部有效，遇到无效签名立即停止
+        :return: 每项的验证结果列表，或 all_valid=True 时的单个布尔值
+
+        不足 workers*chunksize 个签名时进程池的启动开销大于计算量，直接在当前进程中验证；
+        进程池中最多 2*workers 个块同时在途，块按需从 items 中切出。
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        it = iter(items)
+        head = list(islice(it, workers * chunksize)) if workers > 1 else []
+        if workers <= 1 or len(head) < workers * chunksize:
+            chunks = _chunked(chain(head, it), chunksize)
+            if all_valid:
+                return all(_verify_chunk(chunk, True) for chunk in chunks)
+            return [ok for chunk in chunks for ok in _verify_chunk(chunk)]
+
+        chunks = _chunked(chain(head, it), chunksize)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = _map_bounded(pool, _verify_chunk, chunks, 2 * workers, all_valid)
+            if not all_valid:
+                return [ok for oks in results for ok in oks]
+            for ok in results:
+                if not ok:
+                    results.close()  # 取消在途的块
+                    return False
+            return True
 
     @staticmethod
     def ec_add(p1, p2):
@@ -169,6 +485,267 @@ class SM2:
         return (x3, y3)
 
 
+def _iter_chunks(stream, chunk_size):
+    """把文件对象、缓冲区（bytes/mmap/memoryview）或字节块迭代器统一成字节块序列"""
+    if hasattr(stream, "read") and not isinstance(stream, mmap.mmap):
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+        return
+    try:
+        mv = memoryview(stream)
+    except TypeError:
+        yield from stream
+        return
+    with mv:
+        mv = mv.cast("B") if mv.ndim != 1 or mv.itemsize != 1 else mv
+        for i in range(0, len(mv), chunk_size):
+            yield mv[i:i + chunk_size]
+
+
+class PointTableCache:
+    """按点缓存固定基窗口预计算表的LRU缓存
+
+    以仿射坐标元组 (x, y) 为键，总占用超过 max_bytes 时淘汰最久未使用的表。
+    命中的公钥无需点倍运算，验签速度接近对基点G的点乘。建表代价约为数次点乘，
+    因此一个点出现 admit_after 次后才建表，只出现一次的公钥不会被缓存。
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024, window=4, admit_after=2, max_seen=65536):
+        self.max_bytes = max_bytes
+        self.window = window
+        self.admit_after = admit_after
+        self.max_seen = max_seen
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._tables = OrderedDict()
+        self._seen = OrderedDict()  # 尚未建表的点的出现次数
+        self._lock = threading.Lock()
+
+    def get(self, point):
+        """返回点的预计算表；未命中时，出现次数达到阈值才构建并缓存，否则返回None"""
+        with self._lock:
+            entry = self._tables.get(point)
+            if entry is not None:
+                self._tables.move_to_end(point)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            seen = self._seen.pop(point, 0) + 1
+            if seen < self.admit_after:
+                self._seen[point] = seen
+                if len(self._seen) > self.max_seen:
+                    self._seen.popitem(last=False)
+                return None
+        table = SM2._build_fixed_table(point, self.window)
+        size = self._table_nbytes(table)
+        with self._lock:
+            if point not in self._tables:
+                self._tables[point] = (table, size)
+                self.nbytes += size
+                while self.nbytes > self.max_bytes and len(self._tables) > 1:
+                    _, (_, evicted) = self._tables.popitem(last=False)
+                    self.nbytes -= evicted
+                    self.evictions += 1
+        return table
+
+    @staticmethod
+    def _table_nbytes(table):
+        """估算一张表占用的内存"""
+        return sum(sys.getsizeof(row) + sum(sys.getsizeof(entry) + sum(sys.getsizeof(c) for c in entry)
+                                            for entry in row) for row in table)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._tables),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._seen.clear()
+            self.nbytes = 0
+
+
+# 公钥预计算表缓存，置为None可关闭
+SM2.point_cache = PointTableCache()
+
+
+class SignPool:
+    """签名离线预计算池
+
+    [k]G 与消息无关，预先生成 (k, x1) 对存入队列，签名时取出即可。
+    每个 (k, x1) 出队后不再放回，保证随机数只使用一次；队列低于 low_watermark
+    时开始补充，每批 REFILL_BATCH 个，连续补到 depth。队列为空时当场计算，不会阻塞签名。
+
+    补充在单独的工作进程中进行并降到最低调度优先级，不占用签名线程的 GIL；同进程的后台
+    线程在连续签名时会与请求争抢 GIL，反而拉高 p99。工作进程不可用时队列保持为空，签名当场计算。
+    """
+
+    REFILL_BATCH = 32  # 每批生成的个数，一批共用一次求逆
+
+    def __init__(self, depth=256, low_watermark=64):
+        if not 0 <= low_watermark < depth:
+            raise ValueError("low_watermark must be in [0, depth)")
+        self.depth = depth
+        self.low_watermark = low_watermark
+        self.hits = 0
+        self.misses = 0
+        self._items = deque()
+        self._lock = threading.RLock()  # 已完成的任务会在 add_done_callback 中同步回调
+        self._closed = False
+        self._future = None
+        self._executor = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context(_REFILL_START_METHOD),
+                                             initializer=_lower_priority)
+        _sign_pools.add(self)
+        with self._lock:
+            self._request()
+
+    def _request(self):
+        """持有锁时调用：没有在途的批次且未满时提交下一批"""
+        missing = self.depth - len(self._items)
+        if self._closed or self._future is not None or missing <= 0:
+            return
+        try:
+            self._future = self._executor.submit(_nonce_batch, min(missing, self.REFILL_BATCH))
+        except RuntimeError:  # 进程池已关闭或损坏，之后当场计算
+            return
+        self._future.add_done_callback(self._filled)
+
+    def _filled(self, future):
+        with self._lock:
+            self._future = None
+            if self._closed or future.cancelled() or future.exception() is not None:
+                return
+            self._items.extend(future.result())
+            self._request()
+
+    def pop(self):
+        """取出一个 (k, x1)，取出的随机数不会再被任何调用方拿到"""
+        with self._lock:
+            item = self._items.popleft() if self._items else None
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if len(self._items) <= self.low_watermark:
+                self._request()
+        if item is None:
+            item = SM2._new_nonce()
+        return item
+
+    def __len__(self):
+        return len(self._items)
+
+    def _discard(self):
+        """丢弃所有预计算的随机数"""
+        with self._lock:
+            self._items.clear()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._items.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# fork 不重新导入调用方的 __main__；子进程继承的随机数队列由 _discard_sign_pools 清空
+_REFILL_START_METHOD = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _lower_priority():
+    if hasattr(os, "nice"):
+        os.nice(19)
+
+
+def _nonce_batch(n):
+    """工作进程任务：生成 n 个 (k, x1)"""
+    return SM2._new_nonces(n)
+
+
+_sign_pools = weakref.WeakSet()
+
+
+def _discard_sign_pools():
+    """fork后子进程继承的队列与父进程相同，必须清空以免随机数重用"""
+    for pool in list(_sign_pools):
+        # fork 时锁可能被其他线程持有，子进程中直接换新，不去获取
+        pool._lock = threading.RLock()
+        pool._items = deque()
+        pool._future = None
+        pool._closed = True
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_discard_sign_pools)
+
+
+def _chunked(items, size):
+    """将可迭代对象按固定大小切块"""
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _map_bounded(pool, fn, chunks, window, *args):
+    """按顺序产出 fn(chunk, *args)，最多 window 个任务同时在途；关闭生成器时取消未完成的任务"""
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(fn, chunk, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _verify_chunk(chunk, all_valid=False):
+    """进程池任务：验证一批签名"""
+    if all_valid:
+        return all(SM2._verify_with(pk, msg, sig, projective=True) for pk, msg, sig in chunk)
+    return [SM2._verify_with(pk, msg, sig) for pk, msg, sig in chunk]
+
+
+def cross_check(rounds=10):
+    """与 sm2_basic.SM2（仿射坐标的直接实现）交叉验证点运算与签名互通"""
+    import sm2_basic
+    basic = sm2_basic.SM2
+    for _ in range(rounds):
+        k1 = secrets.randbelow(SM2.N - 1) + 1
+        k2 = secrets.randbelow(SM2.N - 1) + 1
+        Q = basic.ec_mult(k1, SM2.G, SM2.P)
+        assert SM2.mul_base(k1) == Q
+        assert SM2.ec_mult(k2, Q) == basic.ec_mult(k2, Q, SM2.P)
+        assert SM2.multi_mul(k1, SM2.G, k2, Q) == basic.ec_add(
+            basic.ec_mult(k1, SM2.G, SM2.P), basic.ec_mult(k2, Q, SM2.P), SM2.P)
+        assert SM2.jacobian_to_affine(*SM2.jacobian_double(*Q, 1)) == basic.ec_add(Q, Q, SM2.P)
+        assert SM2.inv_mod(k1, SM2.N) == basic.inv_mod(k1, SM2.N)
+
+        opt, ref = SM2(), basic()
+        opt.private_key, opt.public_key = k1, Q
+        ref.private_key, ref.public_key = k1, Q
+        message = secrets.token_bytes(32)
+        assert ref.verify(message, opt.sign(message))
+        assert opt.verify(message, ref.sign(message))
+    return True
+
+
 if __name__ == "__main__":
     sm2 = SM2()
 
@@ -191,9 +768,9 @@ if __name__ == "__main__":
     is_valid_tampered = sm2.verify(tampered_message, signature)
     print("篡改消息验证结果:", "有效" if is_valid_tampered else "无效")
 
-    # 5. 性能测试（10次签名平均耗时）
+    # 5. 性能测试（100次签名平均耗时）
     import time
     start = time.time()
     for _ in range(100):
         sm2.sign(message)
-    print(f"100次签名平均耗时: {(time.time()-start)/10:.4f}s")
+    print(f"100次签名平均耗时: {(time.time()-start)/100:.4f}s（完整基准测试见 sm2_bench.py）")
@@ -0,0 +1,92 @@
+"""可序列化的 Bloom 过滤器，用于 PSI 中以紧凑形式传输双重盲化集合 Z
+
+元素先截断为 16 字节的 BLAKE2b 摘要，再由摘要的两半做双重哈希
+g_i = h1 + i·h2 (mod m) 得到 k 个比特位置。按容量 n 与误判率 p 选取
+m = -n·ln(p) / (ln 2)²，k = (m / n)·ln 2。
+"""
+import hashlib
+import math
+import struct
+
+_HEADER = struct.Struct(">4sQIQ")  # magic, 比特数 m, 哈希个数 k, 元素个数
+_MAGIC = b"BLM1"
+
+
+def digest(item):
+    """元素的 16 字节截断哈希，Bloom 过滤器只依赖它"""
+    if isinstance(item, str):
+        item = item.encode()
+    return hashlib.blake2b(item, digest_size=16).digest()
+
+
+class BloomFilter:
+    def __init__(self, capacity, fp_rate=1e-6, num_bits=None, num_hashes=None):
+        if not 0 < fp_rate < 1:
+            raise ValueError("fp_rate must be in (0, 1)")
+        capacity = max(capacity, 1)
+        if num_bits is None:
+            num_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        if num_hashes is None:
+            num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.count = 0
+        self.bits = bytearray((num_bits + 7) // 8)
+
+    def _positions(self, d):
+        h1 = int.from_bytes(d[:8], "big")
+        h2 = int.from_bytes(d[8:], "big") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add_digest(self, d):
+        bits = self.bits
+        for pos in self._positions(d):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def add(self, item):
+        self.add_digest(digest(item))
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def contains_digest(self, d):
+        bits = self.bits
+        return all(bits[pos >> 3] >> (pos & 7) & 1 for pos in self._positions(d))
+
+    def __contains__(self, item):
+        return self.contains_digest(digest(item))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def fp_rate(self):
+        """按当前元素个数估计的误判率"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    @classmethod
+    def from_digests(cls, digests, fp_rate=1e-6):
+        digests = list(digests)
+        bloom = cls(len(digests), fp_rate)
+        for d in digests:
+            bloom.add_digest(d)
+        return bloom
+
+    def to_bytes(self):
+        return _HEADER.pack(_MAGIC, self.num_bits, self.num_hashes, self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, num_bits, num_hashes, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("not a serialized BloomFilter")
+        body = data[_HEADER.size:]
+        if len(body) != (num_bits + 7) // 8:
+            raise ValueError("truncated BloomFilter")
+        bloom = cls(max(count, 1), num_bits=num_bits, num_hashes=num_hashes)
+        bloom.bits[:] = body
+        bloom.count = count
+        return bloom
@@ -0,0 +1,196 @@
+"""PSI 协议使用的 DDH 群
+
+协议只需要四个操作：把标识符哈希到群元素、对群元素做幂运算（椭圆曲线上为点乘）、
+选取随机私钥、把群元素编码为字节。群元素都是可哈希对象，可以直接放进集合求交。
+私钥都在指数群（阶为 order）中可逆，换钥时可以用 k_new / k_old 直接把 H(x)^k_old 变为 H(x)^k_new。
+
+- ModPGroup：模素数 p 的乘法群，H(x) = SHA256(x) mod p，元素为整数（原始实现，便于对比）
+- SM2Group：SM2 曲线上的点，复用 project5/sm2_optimized.py 的 Jacobian 点乘，
+  元素为 33 字节压缩编码
+"""
+import hashlib
+import importlib
+import math
+import os
+import secrets
+import sys
+
+from Crypto.Util.number import getPrime
+
+
+def hash_to_group(element, prime_order):
+    # 将元素哈希到群中
+    if isinstance(element, str):
+        element = element.encode()
+    h = hashlib.sha256(element).digest()
+    return int.from_bytes(h, 'big') % prime_order
+
+
+class ModPGroup:
+    """模 p 乘法群，p 默认为新生成的 256 位素数
+
+    注意 256 位的 p 只用于演示和对比，达到 128 位安全需要约 3072 位。
+    """
+
+    name = "modp"
+
+    def __init__(self, prime=None, bits=256):
+        self.prime = prime if prime is not None else getPrime(bits)  # 选择一个质数阶的群
+        self.element_size = (self.prime.bit_length() + 7) // 8
+
+    @property
+    def order(self):
+        """指数所在的模数 p - 1"""
+        return self.prime - 1
+
+    def random_scalar(self):
+        """选择盲化私钥 k ∈ [1, p-2]，且与 p-1 互素以便换钥时求逆"""
+        while True:
+            k = secrets.randbelow(self.prime - 2) + 1
+            if math.gcd(k, self.order) == 1:
+                return k
+
+    def invert_scalar(self, k):
+        return pow(k, -1, self.order)
+
+    def hash_exp_batch(self, items, key):
+        """[H(x)^k for x in items]"""
+        p = self.prime
+        return [pow(hash_to_group(x, p), key, p) for x in items]
+
+    def exp_batch(self, elements, key):
+        p = self.prime
+        return [pow(h, key, p) for h in elements]
+
+    def encode(self, element):
+        return element.to_bytes(self.element_size, "big")
+
+    def decode(self, data, check=True):
+        return int.from_bytes(data, "big")
+
+
+def _load_sm2(module="sm2_optimized"):
+    """导入 project5 中的模块，必要时把 project5 加入 sys.path"""
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "project5"))
+        return importlib.import_module(module)
+
+
+class SM2Group:
+    """SM2 曲线上的素数阶群（余因子为 1），元素为压缩点编码 02/03 ‖ x（33 字节）
+
+    哈希到曲线采用 try-and-increment：x = SM3(标签 ‖ 计数器 ‖ 消息) mod p，直到
+    x³ - 3x + b 是二次剩余，取 y 为偶数的那个根。p ≡ 3 (mod 4)，开方为一次模幂。
+    尝试次数与输入有关，不是常数时间的，仅适合哈希公开或已盲化的标识符。
+    """
+
+    name = "sm2"
+    element_size = 33
+    HASH_TAG = b"SM2-PSI-H2C"
+
+    def __init__(self):
+        self.sm2 = _load_sm2()
+        self.curve = self.sm2.SM2
+
+    def __getstate__(self):
+        return {}  # 子进程中重新导入，不序列化模块对象
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    @property
+    def order(self):
+        return self.curve.N
+
+    def random_scalar(self):
+        return secrets.randbelow(self.curve.N - 1) + 1
+
+    def invert_scalar(self, k):
+        return pow(k, -1, self.order)
+
+    def _rhs(self, x):
+        P = self.curve.P
+        return (x * x * x - 3 * x + self.curve.B) % P
+
+    def hash_to_curve(self, element):
+        """返回仿射点 (x, y)"""
+        if isinstance(element, str):
+            element = element.encode()
+        P = self.curve.P
+        counter = 0
+        while True:
+            digest = self.sm2.SM3Hash(self.HASH_TAG + counter.to_bytes(4, "big") + element).digest()
+            x = int.from_bytes(digest, "big") % P
+            rhs = self._rhs(x)
+            y = pow(rhs, (P + 1) // 4, P)
+            if y * y % P == rhs and rhs != 0:
+                return (x, y if y % 2 == 0 else P - y)
+            counter += 1
+
+    def _compress(self, point):
+        x, y = point
+        return bytes([2 | (y & 1)]) + x.to_bytes(32, "big")
+
+    def _decompress(self, data):
+        if len(data) != 33 or data[0] not in (2, 3):
+            raise ValueError("invalid compressed SM2 point")
+        P = self.curve.P
+        x = int.from_bytes(data[1:], "big")
+        rhs = self._rhs(x)
+        y = pow(rhs, (P + 1) // 4, P)
+        if x >= P or y * y % P != rhs:
+            raise ValueError("point is not on the SM2 curve")
+        if y & 1 != data[0] & 1:
+            y = P - y
+        return (x, y)
+
+    def _mul_batch(self, points, key):
+        """[k]P_i，Jacobian 点乘后一次批量求逆转回仿射坐标"""
+        SM2 = self.curve
+        jacobian = [SM2._wnaf_mul_jacobian(((key, point),)) for point in points]
+        return [self._compress(point) for point in SM2.batch_to_affine(jacobian)]
+
+    def hash_exp_batch(self, items, key):
+        return self._mul_batch([self.hash_to_curve(x) for x in items], key)
+
+    def exp_batch(self, elements, key):
+        return self._mul_batch([self._decompress(e) for e in elements], key)
+
+    def encode(self, element):
+        return element
+
+    def decode(self, data, check=True):
+        """check=False 用于读取自己保存的可信数据，跳过曲线校验（一次开方）"""
+        if check:
+            self._decompress(data)  # 校验点在曲线上
+        return bytes(data)
+
+
+GROUPS = {"modp": ModPGroup, "sm2": SM2Group}
+
+
+def group_params(group):
+    """群的公开参数，可 JSON 序列化"""
+    params = {"group": group.name}
+    if isinstance(group, ModPGroup):
+        params["prime"] = hex(group.prime)
+    return params
+
+
+def group_from_params(params):
+    if params["group"] == "modp":
+        return ModPGroup(int(params["prime"], 16))
+    return GROUPS[params["group"]]()
+
+
+def as_group(group):
+    """接受群对象、群名称或素数（视为 ModPGroup）"""
+    if group is None:
+        return ModPGroup()
+    if isinstance(group, int):
+        return ModPGroup(group)
+    if isinstance(group, str):
+        return GROUPS[group]()
+    return group
@@ -1,50 +1,409 @@
-# Python示例(需要安装pycryptodome和phe库)
-from Crypto.Util.number import getPrime
-from phe import paillier  # 加法同态加密库
-import hashlib
+"""PSI-Sum 协议（Google Password Checkup）的流式分批实现（需要安装pycryptodome和phe库）
+
+双方输入都是可迭代对象（可直接来自 read_identifiers / read_records 读取的文件），
+按 batch_size 分批经生成器流水线处理，任一时刻只有少数几批在内存中，峰值内存
+与 P2 的集合大小无关。workers > 1 时每一轮的模幂与 Paillier 加密按批分发到进程池，
+结果按输入顺序取回后再打乱。P1 需要保留集合 Z（大小等于 |V|）用于求交，交集和在
+读取 P2 数据的同时累加，不保存中间列表。
+
+打乱顺序在每一批内部进行，批与批之间保持输入顺序；如需全局打乱，应在输入侧
+（例如对文件预先 shuf）完成。
+
+盲化所用的 DDH 群可插拔（groups.py）：默认模 p 乘法群，或 SM2 曲线（33 字节压缩点）。
+Z 可以按列表逐批发送，也可以由 P2 压缩成 Bloom 过滤器（bloom.py）一次发送。
+
+Paillier 是开销最大的部分：PaillierRandomnessPool 离线预计算 r^n mod n²，在线加密
+只需一次乘法；SlotPacker 把同一条记录的多个有界计数打包进一个明文；交集和按块在
+整数上连乘密文（sum_encrypted）。
+"""
+import argparse
 import random
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from itertools import islice
+
+from phe import paillier  # 加法同态加密库
+
+from bloom import BloomFilter, digest
+from groups import GROUPS, as_group
+
+DEFAULT_BATCH_SIZE = 4096
+_shuffle = random.SystemRandom().shuffle
+
+
+def batched(iterable, size):
+    """按 size 个一组切分迭代器，最后一批可能不足 size"""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def read_identifiers(path, encoding="utf-8"):
+    """逐行读取 P1 的标识符，跳过空行"""
+    with open(path, encoding=encoding) as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line:
+                yield line
+
+
+def read_records(path, delimiter=",", encoding="utf-8"):
+    """逐行读取 P2 的 (标识符, 次数)，格式为 "标识符<delimiter>次数"，按最后一个分隔符切分"""
+    with open(path, encoding=encoding) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            identifier, sep, count = line.rpartition(delimiter)
+            if not sep:
+                raise ValueError(f"{path}:{lineno}: missing count")
+            yield identifier, int(count)
+
+
+def _blind_batch(batch, key, group):
+    """H(x)^k，用于 P1 Round 1 和 P2 对自身元素的盲化"""
+    return group.hash_exp_batch(batch, key)
+
+
+def _exp_batch(batch, key, group):
+    """对已盲化的群元素再做一次幂运算"""
+    return group.exp_batch(batch, key)
+
+
+def _encrypt_batch(batch, key, group, public_key):
+    """P2 Round 2：(H(w)^k2, 密文, 指数)，密文以整数返回，避免每个结果都序列化一份公钥"""
+    out = []
+    hashed = group.hash_exp_batch([w for w, _ in batch], key)
+    for h, (_, t) in zip(hashed, batch):
+        ciphertext = public_key.encrypt(t)
+        out.append((h, ciphertext.ciphertext(be_secure=False), ciphertext.exponent))
+    return out
+
+
+def map_batches(func, batches, args=(), workers=1, select=None):
+    """逐批计算 func(select(batch), *args)，按输入顺序产出 (batch, 结果)
+
+    select 用于只把批中需要计算的部分交给 func（例如去掉密文），默认传整批。
+    workers > 1 时分发到进程池，最多 2*workers 批同时在途，不会一次性读完输入。
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield batch, func(select(batch) if select else batch, *args)
+        return
+    pool = ProcessPoolExecutor(workers)
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append((batch, pool.submit(func, select(batch) if select else batch, *args)))
+            if len(pending) >= 2 * workers:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+    finally:
+        pool.shutdown(wait=not pending, cancel_futures=True)
+
+
+def _random_factors(count, n, nsquare):
+    """生成 count 个 Paillier 随机因子 r^n mod n²"""
+    return [pow(secrets.randbelow(n - 1) + 1, n, nsquare) for _ in range(count)]
+
+
+def _product_mod(values, modulus):
+    return reduce(lambda a, b: a * b % modulus, values, 1)
+
+
+def _align_exponents(ciphertexts):
+    """把一批密文调整到相同指数，返回 (整数密文列表, 指数)"""
+    exponent = min(c.exponent for c in ciphertexts)
+    return [(c if c.exponent == exponent else c.decrease_exponent_to(exponent)).ciphertext(be_secure=False)
+            for c in ciphertexts], exponent
+
+
+def sum_encrypted(ciphertexts, public_key, chunk_size=1024, workers=1):
+    """同态求和：按块直接在整数上连乘密文，比逐个 EncryptedNumber 相加少一层对象开销
+
+    workers > 1 时各块在进程池中并行相乘。空输入返回 Enc(0)。
+    """
+    total = None
+    aligned = (_align_exponents(batch) for batch in batched(ciphertexts, chunk_size))
+    for (_, exponent), product in map_batches(_product_mod, aligned, (public_key.nsquare,), workers,
+                                              select=lambda item: item[0]):
+        part = paillier.EncryptedNumber(public_key, product, exponent)
+        total = part if total is None else total + part
+    return total if total is not None else public_key.encrypt(0)
+
+
+class PaillierRandomnessPool:
+    """Paillier 加密的离线随机数池
+
+    Enc(m) = (1 + n·m)·r^n mod n²，其中 r^n mod n² 与明文无关，可以在会话开始前用 fill()
+    批量（可多进程）预计算。每个因子取出后即作废，不会重复使用；池空时当场计算，不会阻塞。
+    """
+
+    def __init__(self, public_key):
+        self.public_key = public_key
+        self.hits = 0
+        self.misses = 0
+        self._factors = deque()
+        self._lock = threading.Lock()
+
+    def fill(self, count, workers=1, batch_size=256):
+        """预计算 count 个随机因子加入池中"""
+        pk = self.public_key
+        sizes = (min(batch_size, count - i) for i in range(0, count, batch_size))
+        for _, factors in map_batches(_random_factors, sizes, (pk.n, pk.nsquare), workers):
+            with self._lock:
+                self._factors.extend(factors)
+        return self
+
+    def __len__(self):
+        return len(self._factors)
+
+    def _take(self):
+        with self._lock:
+            if self._factors:
+                self.hits += 1
+                return self._factors.popleft()
+            self.misses += 1
+        pk = self.public_key
+        return _random_factors(1, pk.n, pk.nsquare)[0]
+
+    def encrypt(self, value):
+        """与 public_key.encrypt(value) 等价，随机因子取自池中"""
+        pk = self.public_key
+        encoding = paillier.EncodedNumber.encode(pk, value)
+        nude = (pk.n * encoding.encoding + 1) % pk.nsquare  # g = n + 1: g^m = 1 + n·m mod n²
+        return paillier.EncryptedNumber(pk, nude * self._take() % pk.nsquare, encoding.exponent)
+
+    def rerandomize(self, ciphertext):
+        """返回同一明文的新密文（乘上一个新的 r^n）"""
+        pk = self.public_key
+        return paillier.EncryptedNumber(pk, ciphertext.ciphertext(be_secure=False) * self._take() % pk.nsquare,
+                                        ciphertext.exponent)
+
+
+class SlotPacker:
+    """把同一条记录的若干个有界非负计数打包进一个 Paillier 明文
+
+    第 i 个计数占第 [i·slot_bits, (i+1)·slot_bits) 位，同态相加即逐槽相加。slot_bits 必须
+    容纳参与求和的所有计数之和，否则会进位到相邻槽；for_counts 按最大计数与最大求和项数选择。
+    P1 按记录挑选密文，所以不同记录的计数不能共用一个密文。
+    """
+
+    def __init__(self, slots, slot_bits, public_key=None):
+        if slots < 1 or slot_bits < 1:
+            raise ValueError("slots and slot_bits must be positive")
+        # 打包值须小于 max_int，否则 phe 会把它解码为负数
+        if public_key is not None and slots * slot_bits >= public_key.max_int.bit_length():
+            raise ValueError("packed plaintext does not fit the Paillier key")
+        self.slots = slots
+        self.slot_bits = slot_bits
+        self._mask = (1 << slot_bits) - 1
+
+    @classmethod
+    def for_counts(cls, slots, max_count, max_terms, public_key=None):
+        """每个计数不超过 max_count、最多 max_terms 条记录求和时所需的槽宽"""
+        return cls(slots, (max_count * max_terms).bit_length(), public_key)
+
+    def pack(self, counts):
+        if len(counts) > self.slots:
+            raise ValueError(f"at most {self.slots} counts per plaintext")
+        value = 0
+        for i, count in enumerate(counts):
+            if not 0 <= count <= self._mask:
+                raise ValueError(f"count {count} does not fit in {self.slot_bits} bits")
+            value |= count << (i * self.slot_bits)
+        return value
+
+    def unpack(self, value):
+        if value < 0 or value >> (self.slots * self.slot_bits):
+            raise OverflowError("slot overflow: slot_bits too small for this sum")
+        return [(value >> (i * self.slot_bits)) & self._mask for i in range(self.slots)]
+
+
+class PSISumParty1:
+    """P1：持有标识符集合 V，得到交集的同态加密和"""
+
+    def __init__(self, group, public_key, key=None, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+        self.group = as_group(group)
+        self.public_key = public_key
+        self.key = key if key is not None else self.group.random_scalar()
+        self.batch_size = batch_size
+        self.workers = workers
+        self.z_set = set()
+        self.z_filter = None
+        self.intersection_size = 0
+
+    def blind(self, identifiers):
+        """Round 1：逐批输出打乱后的 H(v)^k1"""
+        batches = batched(identifiers, self.batch_size)
+        for _, blinded in map_batches(_blind_batch, batches, (self.key, self.group), self.workers):
+            _shuffle(blinded)
+            yield blinded
+
+    def receive_z(self, batches):
+        """接收 P2 返回的 H(v)^(k1·k2)，构建集合 Z"""
+        for batch in batches:
+            self.z_set.update(batch)
+
+    def receive_z_filter(self, bloom):
+        """接收 P2 发来的 Z 的 Bloom 过滤器（BloomFilter 或其序列化字节）"""
+        self.z_filter = BloomFilter.from_bytes(bloom) if isinstance(bloom, (bytes, bytearray)) else bloom
+
+    def intersect_sum(self, batches):
+        """Round 3：对 P2 的 (H(w)^k2, Enc(t)) 再盲化，命中 Z 的密文边读边累加
+
+        返回前重新随机化，否则 P2 可以用自己发出的密文之积反推哪些记录命中。
+        """
+        total = sum_encrypted(self._matches(batches), self.public_key)
+        total.obfuscate()
+        return total
+
+    def _matches(self, batches):
+        if self.z_filter is not None:
+            bloom, encode = self.z_filter, self.group.encode
+
+            def contains(h):
+                return encode(h) in bloom
+        else:
+            contains = self.z_set.__contains__
+        # 只把群元素交给子进程，密文留在本进程按位置对应
+        for batch, reblinded in map_batches(_exp_batch, batches, (self.key, self.group), self.workers,
+                                            select=lambda batch: [h for h, _ in batch]):
+            for (_, ciphertext), h in zip(batch, reblinded):
+                if contains(h):
+                    self.intersection_size += 1
+                    yield ciphertext
+
+
+class PSISumParty2:
+    """P2：持有 (标识符, 次数) 集合 W 及 Paillier 私钥
+
+    设置 packer 时每条记录为 (标识符, [计数, ...])，decrypt 返回逐槽求和的列表；
+    设置 randomness_pool 时加密使用池中预计算的随机因子。设置 store（store.BlindedStore）时
+    使用其长期私钥，encrypt_records(None) 直接输出库中已盲化加密的记录，不再逐条计算。
+    """
+
+    def __init__(self, group, key=None, keypair=None, batch_size=DEFAULT_BATCH_SIZE, workers=1,
+                 randomness_pool=None, packer=None, store=None):
+        self.group = as_group(group)
+        self.store = store
+        if store is not None:
+            key = store.key
+        self.key = key if key is not None else self.group.random_scalar()
+        # P2生成Paillier同态加密密钥对
+        self.public_key, self.private_key = keypair or paillier.generate_paillier_keypair()
+        self.batch_size = batch_size
+        self.workers = workers
+        self.randomness_pool = randomness_pool
+        self.packer = packer
+
+    def reblind(self, batches):
+        """Round 2：对 P1 的每批元素计算 (H(v)^k1)^k2 并在批内打乱"""
+        for _, z in map_batches(_exp_batch, batches, (self.key, self.group), self.workers):
+            _shuffle(z)
+            yield z
+
+    def reblind_filter(self, batches, fp_rate=1e-9):
+        """Round 2 的紧凑模式：把 Z 压缩成 Bloom 过滤器返回，用 to_bytes() 序列化后发送
+
+        误判会把不在交集中的记录计入交集和，期望误计条数约为 |W|·fp_rate，
+        fp_rate 应远小于 1/|W|。即便如此，每个元素也只需约 -1.44·log2(fp_rate) 位。
+        """
+        encode = self.group.encode
+        return BloomFilter.from_digests((digest(encode(z)) for batch in self.reblind(batches) for z in batch),
+                                        fp_rate)
+
+    def encrypt_records(self, records):
+        """Round 2：逐批输出打乱后的 (H(w)^k2, Enc(t))，records 为 None 时取自 store"""
+        public_key, pool = self.public_key, self.randomness_pool
+        if records is None:
+            if self.store is None:
+                raise ValueError("no records and no store")
+            for out in self.store.batches(self.batch_size, pool):
+                _shuffle(out)
+                yield out
+            return
+        if self.packer is not None:
+            records = ((w, self.packer.pack(counts)) for w, counts in records)
+        batches = batched(records, self.batch_size)
+        if pool is not None:
+            # 子进程只做哈希和盲化，加密在本进程用预计算因子完成
+            results = map_batches(_blind_batch, batches, (self.key, self.group), self.workers,
+                                  select=lambda batch: [w for w, _ in batch])
+            for batch, hashed in results:
+                out = [(h, pool.encrypt(t)) for h, (_, t) in zip(hashed, batch)]
+                _shuffle(out)
+                yield out
+            return
+        for _, result in map_batches(_encrypt_batch, batches, (self.key, self.group, public_key),
+                                     self.workers):
+            out = [(h, paillier.EncryptedNumber(public_key, c, exponent)) for h, c, exponent in result]
+            _shuffle(out)
+            yield out
+
+    def decrypt(self, ciphertext):
+        value = self.private_key.decrypt(ciphertext)
+        return self.packer.unpack(value) if self.packer is not None else value
+
+
+def run_psi_sum(identifiers, records, group=None, batch_size=DEFAULT_BATCH_SIZE, keypair=None,
+                workers=1, precompute=0, bloom_fp_rate=None):
+    """在同一进程内执行完整协议，返回 (交集大小, 交集和)
+
+    group 为群对象、群名称（"modp"/"sm2"）或素数 p，默认新建 256 位的 ModPGroup。
+    precompute > 0 时 P2 先离线预计算这么多个 Paillier 随机因子。
+    给出 bloom_fp_rate 时 Z 以该误判率的 Bloom 过滤器传输。
+    """
+    group = as_group(group)
+    party2 = PSISumParty2(group, keypair=keypair, batch_size=batch_size, workers=workers)
+    if precompute:
+        party2.randomness_pool = PaillierRandomnessPool(party2.public_key).fill(precompute, workers)
+    party1 = PSISumParty1(group, party2.public_key, batch_size=batch_size, workers=workers)
+    if bloom_fp_rate is None:
+        party1.receive_z(party2.reblind(party1.blind(identifiers)))
+    else:
+        party1.receive_z_filter(party2.reblind_filter(party1.blind(identifiers), bloom_fp_rate).to_bytes())
+    encrypted_sum = party1.intersect_sum(party2.encrypt_records(records))
+    return party1.intersection_size, party2.decrypt(encrypted_sum)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PSI-Sum demo")
+    parser.add_argument("--p1", metavar="FILE", help="P1 的标识符文件，每行一个")
+    parser.add_argument("--p2", metavar="FILE", help="P2 的记录文件，每行 \"标识符,次数\"")
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--group", choices=sorted(GROUPS), default="modp", help="DDH 群")
+    parser.add_argument("--bloom-fpr", type=float, metavar="RATE", help="Z 以该误判率的 Bloom 过滤器传输")
+    parser.add_argument("--workers", type=int, default=1, help="每一轮使用的进程数")
+    parser.add_argument("--precompute", type=int, default=0, metavar="N",
+                        help="P2 离线预计算 N 个 Paillier 随机因子")
+    args = parser.parse_args(argv)
+
+    # P1的输入
+    V = ["password1", "password2", "user123"]  # 用户密码集合
+    # P2的输入
+    W = [("password1", 100), ("password3", 50), ("user123", 200)]  # (泄露密码, 出现次数)
+    if args.p1:
+        V = read_identifiers(args.p1)
+    if args.p2:
+        W = read_records(args.p2, args.delimiter)
+
+    size, intersection_sum = run_psi_sum(V, W, group=args.group, batch_size=args.batch_size, workers=args.workers,
+                                         precompute=args.precompute,
+                                         bloom_fp_rate=args.bloom_fpr)
+    print(f"Intersection size: {size}")
+    print(f"Intersection sum: {intersection_sum}")
+
 
-# 参数设置
-prime_order = getPrime(256)  # 选择一个质数阶的群
-identifier_space = 2**128    # 标识符空间
-# P1的输入
-V = ["password1", "password2", "user123"]  # 用户密码集合
-
-# P2的输入
-W = [("password1", 100), ("password3", 50), ("user123", 200)]  # (泄露密码, 出现次数)
-# 双方选择随机私钥
-k1 = random.randint(1, prime_order-1)
-k2 = random.randint(1, prime_order-1)
-
-# P2生成Paillier同态加密密钥对
-public_key, private_key = paillier.generate_paillier_keypair()
-def hash_to_group(element):
-    # 将元素哈希到群中
-    h = hashlib.sha256(element.encode()).digest()
-    return int.from_bytes(h, 'big') % prime_order
-
-# P1计算并发送
-P1_hashed = [pow(hash_to_group(v), k1, prime_order) for v in V]
-random.shuffle(P1_hashed)  # 打乱顺序
-# P2处理P1的消息
-Z = [pow(h, k2, prime_order) for h in P1_hashed]
-random.shuffle(Z)
-
-# P2准备自己的数据
-P2_hashed = [(pow(hash_to_group(w), k2, prime_order), public_key.encrypt(t)) 
-             for w, t in W]
-random.shuffle(P2_hashed)
-# P1处理P2的消息
-processed_P2 = [(pow(h, k1, prime_order), t) for h, t in P2_hashed]
-
-# 计算交集
-Z_set = set(Z)
-intersection_indices = [i for i, (h, _) in enumerate(processed_P2) 
-                       if h in Z_set]
-
-# 计算交集和
-sum_ciphertext = sum((t for i, (_, t) in enumerate(processed_P2) 
-                     if i in intersection_indices), 
-                     public_key.encrypt(0))
-intersection_sum = private_key.decrypt(sum_ciphertext)
-print(f"Intersection sum: {intersection_sum}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""PSI-Sum 的性能计数，基于 project5/sm2_metrics.py
+
+导入本模块即登记 PSI 插桩，之后用 sm2_metrics 的同一套接口开启和导出：
+
+    from psi_metrics import instrumented, export
+    with instrumented():
+        run_psi_sum(identifiers, records, group="sm2")
+    print(export())
+
+计数器：
+- psi.hash_to_group / psi.hash_to_curve：哈希到群的元素个数
+- psi.modexp（mod p 群）/ psi.point_mult（SM2 群）：盲化用的模幂或点乘次数，
+  SM2 群的点运算同时计入 sm2.* 计数器
+- paillier.encrypt / paillier.pool_encrypt / paillier.randomness（池预计算的 r^n mod n²）/
+  paillier.ciphertext_mul / paillier.obfuscate（每次 r^n，phe 的 encrypt 内部也会调用一次）
+
+以上计数器在协议阶段内另外按阶段计一份，名称后缀为阶段名，例如 psi.modexp.blind（P1 盲化）、
+psi.modexp.reblind（P2 再盲化 Z）、psi.modexp.encrypt_records（P2 盲化记录）、
+psi.modexp.intersect_sum（P1 再盲化记录），paillier.encrypt.encrypt_records。当前阶段保存在
+线程局部变量中，流水线拉取上游批次时切换到上游阶段，返回后恢复。
+
+直方图：每个协议阶段 psi.phase.<阶段> 记录一次调用的总耗时，流式阶段另有
+psi.phase.<阶段>.batch 记录每批耗时（只计生成器内部的时间，不含下游消费）。阶段是流水线
+串起来的，intersect_sum 的耗时包含它拉取的上游 reblind/encrypt_records 的时间。
+paillier.decrypt 为解密延迟。workers > 1 时子进程中的计算不计入计数器，阶段耗时仍然有效。
+"""
+import threading
+import time
+
+from phe import paillier
+
+import protocol
+from groups import ModPGroup, SM2Group, _load_sm2
+
+sm2_metrics = _load_sm2("sm2_metrics")
+METRICS = sm2_metrics.METRICS
+patch, timing = sm2_metrics.patch, sm2_metrics.timing
+enable, disable, is_enabled = sm2_metrics.enable, sm2_metrics.disable, sm2_metrics.is_enabled
+instrumented, timed = sm2_metrics.instrumented, sm2_metrics.timed
+snapshot, export = sm2_metrics.snapshot, sm2_metrics.export
+
+_phase = threading.local()
+
+
+def _enter(phase):
+    previous = getattr(_phase, "name", None)
+    _phase.name = phase
+    return previous
+
+
+def _count(name, n=1):
+    """计入总数，处于协议阶段内时再计入 name.<阶段>"""
+    METRICS.count(name, n)
+    phase = getattr(_phase, "name", None)
+    if phase is not None:
+        METRICS.count(f"{name}.{phase}", n)
+
+
+def _phase_counting(name, size=None):
+    def make(func):
+        def wrapper(*args, **kwargs):
+            _count(name, 1 if size is None else size(args))
+            return func(*args, **kwargs)
+        return wrapper
+    return make
+
+
+def _timed_phase(phase):
+    """普通阶段：记录耗时，执行期间当前阶段为 phase"""
+    name = f"psi.phase.{phase}"
+
+    def make(func):
+        def wrapper(*args, **kwargs):
+            previous = _enter(phase)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+                _phase.name = previous
+        return wrapper
+    return make
+
+
+def _timed_generator(phase):
+    """生成器阶段：每批的耗时与整个阶段的累计耗时，只在生成器内部执行时切换当前阶段"""
+    name = f"psi.phase.{phase}"
+
+    def make(func):
+        def wrapper(*args, **kwargs):
+            batches = func(*args, **kwargs)
+            total = 0.0
+            try:
+                while True:
+                    previous = _enter(phase)
+                    start = time.perf_counter()
+                    try:
+                        batch = next(batches)
+                    except StopIteration:
+                        total += time.perf_counter() - start
+                        return
+                    finally:
+                        _phase.name = previous
+                    elapsed = time.perf_counter() - start
+                    total += elapsed
+                    METRICS.observe(name + ".batch", elapsed)
+                    yield batch
+            finally:
+                batches.close()
+                METRICS.observe(name, total)
+        return wrapper
+    return make
+
+
+def _size(args):
+    return len(args[1])  # (self, items, key)
+
+
+def _count_hash_exp(func):
+    def hash_exp_batch(self, items, key):
+        _count("psi.hash_to_group", len(items))
+        _count("psi.modexp", len(items))
+        return func(self, items, key)
+    return hash_exp_batch
+
+
+def _instrument_psi():
+    patch(ModPGroup, "hash_exp_batch", _count_hash_exp)
+    patch(ModPGroup, "exp_batch", _phase_counting("psi.modexp", _size))
+    patch(SM2Group, "hash_exp_batch", _phase_counting("psi.hash_to_curve", _size))
+    patch(SM2Group, "_mul_batch", _phase_counting("psi.point_mult", _size))
+
+    patch(paillier.PaillierPublicKey, "encrypt", _phase_counting("paillier.encrypt"))
+    patch(paillier.PaillierPrivateKey, "decrypt", timing("paillier.decrypt"))
+    patch(paillier.EncryptedNumber, "obfuscate", _phase_counting("paillier.obfuscate"))
+    patch(protocol.PaillierRandomnessPool, "encrypt", _phase_counting("paillier.pool_encrypt"))
+    patch(protocol, "_random_factors", _phase_counting("paillier.randomness", lambda args: args[0]))
+    patch(protocol, "_product_mod", _phase_counting("paillier.ciphertext_mul", lambda args: len(args[0])))
+
+    for cls, name in ((protocol.PSISumParty1, "blind"), (protocol.PSISumParty2, "reblind"),
+                      (protocol.PSISumParty2, "encrypt_records")):
+        patch(cls, name, _timed_generator(name))
+    for cls, name in ((protocol.PSISumParty1, "receive_z"), (protocol.PSISumParty1, "receive_z_filter"),
+                      (protocol.PSISumParty2, "reblind_filter"), (protocol.PSISumParty1, "intersect_sum"),
+                      (protocol.PSISumParty2, "decrypt")):
+        patch(cls, name, _timed_phase(name))
+
+
+sm2_metrics.register(_instrument_psi)
@@ -0,0 +1,445 @@
+"""P2 的持久化盲化记录库
+
+(H(w)^k2, Enc(t)) 以定长记录保存在 records.bin 中，读取时内存映射；index.bin 是以
+H(w)^k2 的 16 字节摘要为键、槽位为值的开放寻址哈希表，同样内存映射；meta.json 保存
+群参数、Paillier 公钥和私钥校验值，secret.json（权限 0600）保存 k2 与 Paillier 私钥。
+
+k2 长期不变，泄露库追加或更新时 update 只对变化的记录做哈希、盲化和加密；每次会话
+由 PSISumParty2(store=...) 直接流式读出库中的记录，不再有逐条的模幂和 Paillier 加密。
+换钥（rotate）是单独的批处理：H(w)^k_new = (H(w)^k_old)^(k_new/k_old)，不需要原始标识符。
+
+四个文件放在同一个代际目录（gen-000001 等）中，库目录下的 CURRENT 文件记录当前代际。
+换钥把新的记录、索引、meta 与 secret 全部写进新目录并落盘后，才用一次 os.replace 切换
+CURRENT，任何时刻崩溃打开的都是同一代的记录和密钥。没有 CURRENT 的旧库文件直接位于库目录，
+第一次换钥时迁移为代际目录。
+
+k2 长期不变时 P1 本来就能跨会话关联同一条记录的 H(w)^k2，所以默认不逐会话重新随机化
+密文；需要时可以给 batches 传入 PaillierRandomnessPool。
+
+    python store.py init breaches.db --group sm2
+    python store.py update breaches.db delta.csv --workers 8
+    python store.py rotate breaches.db
+    python transport.py serve --listen 0.0.0.0:9000 --store breaches.db
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+
+from phe import paillier
+
+from bloom import digest
+from groups import GROUPS, as_group, group_from_params, group_params
+from protocol import DEFAULT_BATCH_SIZE, PaillierRandomnessPool, PSISumParty2, map_batches, read_records
+
+_EXPONENT = struct.Struct(">i")
+KEY_CHECK = b"PSI-STORE-KEY-CHECK"
+CURRENT = "CURRENT"
+STORE_FILES = ("records.bin", "index.bin", "meta.json", "secret.json")
+
+
+class _HashIndex:
+    """摘要 -> 槽位的开放寻址哈希表（线性探测），容量为 2 的幂，负载超过 MAX_LOAD 时翻倍重建"""
+
+    _HEADER = struct.Struct(">8sQQ")  # magic, 容量, 条目数
+    _ENTRY = struct.Struct(">16sQ")   # 摘要, 槽位 + 1（0 表示空）
+    _MAGIC = b"PSIIDX01"
+    MAX_LOAD = 0.7
+
+    def __init__(self, path, capacity=1024):
+        self.path = path
+        if not os.path.exists(path):
+            self._create(path, capacity)
+        self._open()
+
+    @staticmethod
+    def capacity_for(count):
+        capacity = 1024
+        while count >= capacity * _HashIndex.MAX_LOAD:
+            capacity *= 2
+        return capacity
+
+    @classmethod
+    def _create(cls, path, capacity):
+        with open(path, "wb") as f:
+            f.write(cls._HEADER.pack(cls._MAGIC, capacity, 0))
+            f.truncate(cls._HEADER.size + capacity * cls._ENTRY.size)
+
+    def _open(self):
+        self._file = open(self.path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        magic, self.capacity, self.count = self._HEADER.unpack_from(self._mm)
+        if magic != self._MAGIC:
+            raise ValueError(f"{self.path} is not a store index")
+
+    def _probe(self, d):
+        """返回 d 所在或应插入的条目偏移，以及已有的槽位（没有时为 -1）"""
+        mm, entry, header = self._mm, self._ENTRY, self._HEADER.size
+        mask = self.capacity - 1
+        i = int.from_bytes(d[:8], "big") & mask
+        while True:
+            offset = header + i * entry.size
+            key, slot = entry.unpack_from(mm, offset)
+            if slot == 0 or key == d:
+                return offset, slot - 1
+            i = (i + 1) & mask
+
+    def get(self, d):
+        _, slot = self._probe(d)
+        return slot if slot >= 0 else None
+
+    def put(self, d, slot):
+        if self.count + 1 > self.capacity * self.MAX_LOAD:
+            self._grow()
+        offset, old = self._probe(d)
+        self._ENTRY.pack_into(self._mm, offset, d, slot + 1)
+        if old < 0:
+            self.count += 1
+            self._HEADER.pack_into(self._mm, 0, self._MAGIC, self.capacity, self.count)
+
+    def items(self):
+        mm, entry, header = self._mm, self._ENTRY, self._HEADER.size
+        for i in range(self.capacity):
+            key, slot = entry.unpack_from(mm, header + i * entry.size)
+            if slot:
+                yield key, slot - 1
+
+    def _grow(self):
+        entries = list(self.items())
+        self.close()
+        tmp = self.path + ".tmp"
+        self._create(tmp, self.capacity * 2)
+        grown = _HashIndex(tmp)
+        for d, slot in entries:
+            grown.put(d, slot)
+        grown.close()
+        os.replace(tmp, self.path)
+        self._open()
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+def _write_json(path, data, mode=0o666):
+    """写入 JSON 并落盘；secret 用 mode=0o600"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path):
+    if os.name == "posix":
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _generation_dir(path):
+    """当前代际目录；旧布局（没有 CURRENT）返回库目录本身"""
+    pointer = os.path.join(path, CURRENT)
+    if not os.path.exists(pointer):
+        return path
+    with open(pointer) as f:
+        return os.path.join(path, f.read().strip())
+
+
+def _write_generation(path, name):
+    """原子地把 CURRENT 指向代际目录 name"""
+    tmp = os.path.join(path, CURRENT + ".new")
+    with open(tmp, "w") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path, CURRENT))
+    _fsync_dir(path)
+
+
+def _rotate_batch(elements, ratio, group):
+    return group.exp_batch(elements, ratio)
+
+
+class BlindedStore:
+    """P2 在长期私钥 k2 下的盲化记录库，见模块说明"""
+
+    def __init__(self, path):
+        self.path = path
+        self.dir = _generation_dir(path)
+        with open(self._file("meta.json")) as f:
+            meta = json.load(f)
+        self.group = group_from_params(meta["group"])
+        self.public_key = paillier.PaillierPublicKey(int(meta["paillier_n"], 16))
+        self.key_check = meta["key_check"]
+        self.width = (self.public_key.nsquare.bit_length() + 7) // 8
+        self.record_size = self.group.element_size + _EXPONENT.size + self.width
+        self.key, self.private_key = None, None
+        if os.path.exists(self._file("secret.json")):
+            with open(self._file("secret.json")) as f:
+                secret = json.load(f)
+            self.key = int(secret["key"], 16)
+            self.private_key = paillier.PaillierPrivateKey(self.public_key, int(secret["paillier_p"], 16),
+                                                           int(secret["paillier_q"], 16))
+            if self._key_check(self.key) != self.key_check:
+                raise ValueError("secret.json does not match this store")
+        self._open()
+
+    @classmethod
+    def create(cls, path, group="modp", keypair=None, key=None, key_length=2048):
+        """新建空库；keypair/key 默认新生成"""
+        if os.path.exists(os.path.join(path, CURRENT)) or os.path.exists(os.path.join(path, "meta.json")):
+            raise FileExistsError(f"store already exists: {path}")
+        group = as_group(group)
+        public_key, private_key = keypair or paillier.generate_paillier_keypair(n_length=key_length)
+        key = key if key is not None else group.random_scalar()
+        name = "gen-000000"
+        gen_dir = os.path.join(path, name)
+        shutil.rmtree(gen_dir, ignore_errors=True)  # 上次未完成的 create
+        os.makedirs(gen_dir)
+        cls._write_files(gen_dir, group, public_key, private_key, key)
+        open(os.path.join(gen_dir, "records.bin"), "wb").close()
+        _HashIndex(os.path.join(gen_dir, "index.bin")).close()
+        _fsync_dir(gen_dir)
+        _write_generation(path, name)
+        return cls(path)
+
+    @classmethod
+    def _write_files(cls, gen_dir, group, public_key, private_key, key):
+        _write_json(os.path.join(gen_dir, "meta.json"),
+                    {"group": group_params(group), "paillier_n": hex(public_key.n),
+                     "key_check": cls._key_check_for(group, key)})
+        _write_json(os.path.join(gen_dir, "secret.json"),
+                    {"key": hex(key), "paillier_p": hex(private_key.p), "paillier_q": hex(private_key.q)}, 0o600)
+
+    def _file(self, name):
+        return os.path.join(self.dir, name)
+
+    def _open(self):
+        self._records = open(self._file("records.bin"), "r+b")
+        self._index = _HashIndex(self._file("index.bin"))
+        self._records.seek(0, os.SEEK_END)
+        size = self._records.tell()
+        # update 先写记录再写索引：中断时末尾可能有尚未进入索引的记录，截掉
+        self.count = self._index.count
+        if size < self.count * self.record_size:
+            raise ValueError(f"{self.path}: index has {self.count} records, records.bin only {size} bytes")
+        if size > self.count * self.record_size:
+            self._records.truncate(self.count * self.record_size)
+
+    @staticmethod
+    def _key_check_for(group, key):
+        return group.encode(group.hash_exp_batch([KEY_CHECK], key)[0]).hex()
+
+    def _key_check(self, key):
+        return self._key_check_for(self.group, key)
+
+    @property
+    def keypair(self):
+        return self.public_key, self.private_key
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def flush(self):
+        self._records.flush()
+        self._index.flush()
+
+    def close(self):
+        self.flush()
+        self._records.close()
+        self._index.close()
+
+    def _pack(self, h, ciphertext):
+        return (self.group.encode(h) + _EXPONENT.pack(ciphertext.exponent)
+                + ciphertext.ciphertext(be_secure=False).to_bytes(self.width, "big"))
+
+    def _unpack_ciphertext(self, data, offset):
+        exponent, = _EXPONENT.unpack_from(data, offset)
+        start = offset + _EXPONENT.size
+        value = int.from_bytes(data[start:start + self.width], "big")
+        return paillier.EncryptedNumber(self.public_key, value, exponent)
+
+    def _read_ciphertext(self, slot):
+        self._records.seek(slot * self.record_size + self.group.element_size)
+        return self._unpack_ciphertext(self._records.read(self.record_size - self.group.element_size), 0)
+
+    def update(self, records, mode="replace", workers=1, pool=None, batch_size=DEFAULT_BATCH_SIZE):
+        """应用增量 (标识符, 次数)：新标识符追加，已有标识符按 mode 覆盖（replace）或同态累加（add）
+
+        只对 records 中的条目做哈希、盲化和加密，返回 (新增条数, 更新条数)。
+        """
+        if mode not in ("replace", "add"):
+            raise ValueError("mode must be 'replace' or 'add'")
+        if self.key is None:
+            raise ValueError("store secret is not available")
+        party = PSISumParty2(self.group, keypair=self.keypair, batch_size=batch_size, workers=workers,
+                             randomness_pool=pool, store=self)
+        encode, index = self.group.encode, self._index
+        inserted = updated = 0
+        for batch in party.encrypt_records(records):
+            pending = {}  # 本批新增的 摘要 -> 槽位，记录落盘后才写入索引
+            for h, ciphertext in batch:
+                d = digest(encode(h))
+                slot = index.get(d)
+                if slot is None:
+                    slot = pending.get(d)
+                if slot is None:
+                    slot = self.count
+                    self.count += 1
+                    pending[d] = slot
+                    inserted += 1
+                else:
+                    if mode == "add":
+                        ciphertext = self._read_ciphertext(slot) + ciphertext
+                    updated += 1
+                self._records.seek(slot * self.record_size)
+                self._records.write(self._pack(h, ciphertext))
+            self._records.flush()
+            os.fsync(self._records.fileno())
+            for d, slot in pending.items():
+                index.put(d, slot)
+        self.flush()
+        return inserted, updated
+
+    def _raw_batches(self, mm, batch_size):
+        """按槽位顺序读出 [(元素字节, 指数与密文字节), ...]"""
+        size, esize = self.record_size, self.group.element_size
+        for start in range(0, self.count, batch_size):
+            end = min(start + batch_size, self.count)
+            yield [(mm[off:off + esize], mm[off + esize:off + size])
+                   for off in range(start * size, end * size, size)]
+
+    def batches(self, batch_size=DEFAULT_BATCH_SIZE, pool=None):
+        """逐批读出 [(H(w)^k2, Enc(t)), ...]；给出 pool 时每个密文重新随机化"""
+        if not self.count:
+            return
+        self._records.flush()
+        group = self.group
+        with mmap.mmap(self._records.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for raw in self._raw_batches(mm, batch_size):
+                out = []
+                for element, tail in raw:
+                    ciphertext = self._unpack_ciphertext(tail, 0)
+                    if pool is not None:
+                        ciphertext = pool.rerandomize(ciphertext)
+                    out.append((group.decode(element, check=False), ciphertext))
+                yield out
+
+    def rotate(self, new_key=None, workers=1, batch_size=DEFAULT_BATCH_SIZE):
+        """换钥：全部记录乘以 k_new/k_old 次幂并重建索引，写入新的代际目录后切换 CURRENT"""
+        if self.key is None:
+            raise ValueError("store secret is not available")
+        group = self.group
+        new_key = new_key if new_key is not None else group.random_scalar()
+        ratio = new_key * group.invert_scalar(self.key) % group.order
+        number = int(os.path.basename(self.dir)[4:]) + 1 if self.dir != self.path else 1
+        name = f"gen-{number:06d}"
+        gen_dir = os.path.join(self.path, name)
+        self._remove_stale()
+        os.makedirs(gen_dir)
+
+        index = _HashIndex(os.path.join(gen_dir, "index.bin"), _HashIndex.capacity_for(self.count))
+        self._records.flush()
+        slot = 0
+        with open(os.path.join(gen_dir, "records.bin"), "wb") as out:
+            if self.count:
+                with mmap.mmap(self._records.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+                    def elements(batch):
+                        return [group.decode(e, check=False) for e, _ in batch]
+
+                    raw = self._raw_batches(mm, batch_size)
+                    for batch, rotated in map_batches(_rotate_batch, raw, (ratio, group), workers, select=elements):
+                        for (_, tail), h in zip(batch, rotated):
+                            encoded = group.encode(h)
+                            out.write(encoded + tail)
+                            index.put(digest(encoded), slot)
+                            slot += 1
+            out.flush()
+            os.fsync(out.fileno())
+        index.flush()
+        index.close()
+        self._write_files(gen_dir, group, self.public_key, self.private_key, new_key)
+        _fsync_dir(gen_dir)
+
+        self.close()
+        try:
+            _write_generation(self.path, name)  # 切换点：此前崩溃仍是旧代，此后是新代
+            self.dir = gen_dir
+            self.key, self.key_check = new_key, self._key_check(new_key)
+        finally:
+            self._open()
+        self._remove_stale()
+        return new_key
+
+    def _remove_stale(self):
+        """删除当前代以外的代际目录（中断的换钥或换钥后的旧代），以及已迁移的旧布局文件"""
+        for entry in os.listdir(self.path):
+            full = os.path.join(self.path, entry)
+            if entry.startswith("gen-") and full != self.dir:
+                shutil.rmtree(full, ignore_errors=True)
+            elif entry in STORE_FILES and self.dir != self.path:
+                os.remove(full)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="P2 blinded record store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    init = sub.add_parser("init", help="新建空库")
+    init.add_argument("path")
+    init.add_argument("--group", choices=sorted(GROUPS), default="modp")
+    init.add_argument("--key-length", type=int, default=2048, help="Paillier 模数位数")
+    update = sub.add_parser("update", help="应用增量记录文件（每行 \"标识符,次数\"）")
+    update.add_argument("path")
+    update.add_argument("records")
+    update.add_argument("--mode", choices=["replace", "add"], default="replace")
+    update.add_argument("--delimiter", default=",")
+    update.add_argument("--workers", type=int, default=1)
+    update.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    update.add_argument("--precompute", type=int, default=0, metavar="N")
+    rotate = sub.add_parser("rotate", help="更换长期盲化私钥 k2")
+    rotate.add_argument("path")
+    rotate.add_argument("--workers", type=int, default=1)
+    rotate.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    info = sub.add_parser("info", help="显示库信息")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "init":
+        with BlindedStore.create(args.path, args.group, key_length=args.key_length) as store:
+            print(f"created {args.path} ({store.group.name}, {store.public_key.n.bit_length()}-bit Paillier)")
+        return
+    with BlindedStore(args.path) as store:
+        if args.command == "update":
+            pool = None
+            if args.precompute:
+                pool = PaillierRandomnessPool(store.public_key).fill(args.precompute, args.workers)
+            inserted, updated = store.update(read_records(args.records, args.delimiter), args.mode, args.workers,
+                                             pool, args.batch_size)
+            print(f"inserted {inserted}, updated {updated}, total {len(store)}")
+        elif args.command == "rotate":
+            store.rotate(workers=args.workers, batch_size=args.batch_size)
+            print(f"rotated key for {len(store)} records")
+        else:
+            print(json.dumps({"path": args.path, "group": store.group.name, "records": len(store),
+                              "record_size": store.record_size, "index_capacity": store._index.capacity,
+                              "paillier_bits": store.public_key.n.bit_length(),
+                              "has_secret": store.key is not None}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+"""PSI-Sum 的双方网络运行器（asyncio）
+
+P1、P2 分别位于 TCP 或 Unix 套接字两端，消息格式为 1 字节类型 + 4 字节大端长度 + 负载。
+每一轮都按批流式收发：P2 收到 P1 的第一批盲化元素就开始再盲化并回传，同时在后台
+预先加密盲化自己的记录；耗时的计算在线程中（workers > 1 时再分发到进程池）运行，
+事件循环只负责收发。双方都记录收发字节、各轮起止时间与吞吐量，可导出为 JSON 报告。
+
+    python transport.py local --group sm2 --report report.json
+    python transport.py serve --listen 0.0.0.0:9000 --p2 breaches.csv
+    python transport.py connect --connect host:9000 --p1 passwords.txt
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+from phe import paillier
+
+from groups import GROUPS, as_group, group_from_params, group_params
+from protocol import (DEFAULT_BATCH_SIZE, PaillierRandomnessPool, PSISumParty1, PSISumParty2, read_identifiers,
+                      read_records)
+from store import BlindedStore
+
+_FRAME = struct.Struct(">BI")
+_EXPONENT = struct.Struct(">i")
+MAX_FRAME = 1 << 30
+
+# 消息类型
+HELLO, BLINDED, BLINDED_END, Z, Z_END, Z_FILTER, RECORDS, RECORDS_END, SUM, RESULT = range(1, 11)
+_KIND_NAMES = {HELLO: "hello", BLINDED: "blinded", BLINDED_END: "blinded_end", Z: "z", Z_END: "z_end",
+               Z_FILTER: "z_filter", RECORDS: "records", RECORDS_END: "records_end", SUM: "sum", RESULT: "result"}
+
+
+class TransferStats:
+    """一端的收发统计：按消息类型累计帧数与字节，按轮次记录起止时间、条数与字节"""
+
+    def __init__(self, role):
+        self.role = role
+        self.start = time.perf_counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.frames = {}
+        self.rounds = {}
+
+    def frame(self, kind, nbytes, sent):
+        entry = self.frames.setdefault(_KIND_NAMES.get(kind, str(kind)),
+                                       {"sent": 0, "received": 0, "bytes_sent": 0, "bytes_received": 0})
+        if sent:
+            self.bytes_sent += nbytes
+            entry["sent"] += 1
+            entry["bytes_sent"] += nbytes
+        else:
+            self.bytes_received += nbytes
+            entry["received"] += 1
+            entry["bytes_received"] += nbytes
+
+    def mark(self, name, items=0, nbytes=0):
+        """记录某一轮的进展，第一次调用为该轮开始，最后一次为结束"""
+        now = time.perf_counter() - self.start
+        entry = self.rounds.setdefault(name, {"first_s": now, "last_s": now, "items": 0, "bytes": 0})
+        entry["last_s"] = now
+        entry["items"] += items
+        entry["bytes"] += nbytes
+
+    def report(self):
+        wall = time.perf_counter() - self.start
+        rounds = {}
+        for name, entry in self.rounds.items():
+            duration = entry["last_s"] - entry["first_s"]
+            rounds[name] = dict(entry, duration_s=duration,
+                                items_per_s=entry["items"] / duration if duration > 0 else None,
+                                mb_per_s=entry["bytes"] / duration / 1e6 if duration > 0 else None)
+        return {
+            "role": self.role,
+            "wall_s": wall,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "send_mb_per_s": self.bytes_sent / wall / 1e6 if wall > 0 else None,
+            "frames": self.frames,
+            "rounds": rounds,
+        }
+
+
+class Channel:
+    """带长度前缀的帧收发，发送端加锁，多个任务可以共用一个连接"""
+
+    def __init__(self, reader, writer, stats):
+        self.reader = reader
+        self.writer = writer
+        self.stats = stats
+        self._lock = asyncio.Lock()
+
+    async def send(self, kind, payload=b""):
+        if len(payload) > MAX_FRAME:
+            raise ValueError("frame too large")
+        async with self._lock:
+            self.writer.write(_FRAME.pack(kind, len(payload)))
+            self.writer.write(payload)
+            self.stats.frame(kind, _FRAME.size + len(payload), sent=True)
+            await self.writer.drain()
+
+    async def recv(self):
+        kind, n = _FRAME.unpack(await self.reader.readexactly(_FRAME.size))
+        if n > MAX_FRAME:
+            raise ConnectionError("frame too large")
+        payload = await self.reader.readexactly(n) if n else b""
+        self.stats.frame(kind, _FRAME.size + n, sent=False)
+        return kind, payload
+
+    async def expect(self, *kinds):
+        kind, payload = await self.recv()
+        if kind not in kinds:
+            raise ConnectionError(f"unexpected message {_KIND_NAMES.get(kind, kind)}")
+        return kind, payload
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+_END = object()
+
+
+class _Failure:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class Stage:
+    """在后台线程中运行同步的批处理阶段，以异步迭代器产出其结果
+
+    func(iterable)（或 inputs 为 None 时 func()）返回同步迭代器。inputs 是异步迭代器时，
+    其产出逐批送入线程，上游数据边到达边处理。两侧都最多缓冲 maxsize 批：
+    下游消费慢时线程阻塞，线程处理慢时停止读取上游。
+    """
+
+    def __init__(self, func, inputs=None, maxsize=4):
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue(maxsize)
+        self._inbox = queue.SimpleQueue()
+        self._slots = asyncio.Semaphore(maxsize)
+        self._feeder = asyncio.ensure_future(self._feed(inputs)) if inputs is not None else None
+        threading.Thread(target=self._work, args=(func, inputs is not None), daemon=True).start()
+
+    async def _feed(self, inputs):
+        try:
+            async for item in inputs:
+                await self._slots.acquire()
+                self._inbox.put(item)
+        finally:
+            self._inbox.put(_END)
+
+    def _source(self):
+        while True:
+            item = self._inbox.get()
+            self._loop.call_soon_threadsafe(self._slots.release)
+            if item is _END:
+                return
+            yield item
+
+    def _put(self, item):
+        asyncio.run_coroutine_threadsafe(self._outbox.put(item), self._loop).result()
+
+    def _work(self, func, has_inputs):
+        try:
+            for item in (func(self._source()) if has_inputs else func()):
+                self._put(item)
+            self._put(_END)
+        except BaseException as exc:
+            self._put(_Failure(exc))
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            while True:
+                item = await self._outbox.get()
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.exc
+                yield item
+            if self._feeder is not None:
+                await self._feeder  # 上游读取出错时在这里抛出
+        finally:
+            if self._feeder is not None and not self._feeder.done():
+                self._feeder.cancel()
+
+
+def _ciphertext_width(public_key):
+    return (public_key.nsquare.bit_length() + 7) // 8
+
+
+def _pack_elements(group, batch):
+    return b"".join(group.encode(e) for e in batch)
+
+
+def _unpack_elements(group, payload):
+    size = group.element_size
+    if len(payload) % size:
+        raise ConnectionError("truncated element batch")
+    return [group.decode(payload[i:i + size]) for i in range(0, len(payload), size)]
+
+
+def _pack_ciphertext(ciphertext, width, be_secure=False):
+    return _EXPONENT.pack(ciphertext.exponent) + ciphertext.ciphertext(be_secure).to_bytes(width, "big")
+
+
+def _unpack_ciphertext(public_key, payload, width):
+    exponent, = _EXPONENT.unpack_from(payload)
+    value = int.from_bytes(payload[_EXPONENT.size:_EXPONENT.size + width], "big")
+    return paillier.EncryptedNumber(public_key, value, exponent)
+
+
+def _pack_records(group, batch, width):
+    # P2 加密时已随机化，发送时不再重复
+    return b"".join(group.encode(h) + _pack_ciphertext(c, width) for h, c in batch)
+
+
+def _unpack_records(group, public_key, payload, width):
+    size = group.element_size + _EXPONENT.size + width
+    if len(payload) % size:
+        raise ConnectionError("truncated record batch")
+    return [(group.decode(payload[i:i + group.element_size]),
+             _unpack_ciphertext(public_key, payload[i + group.element_size:i + size], width))
+            for i in range(0, len(payload), size)]
+
+
+async def serve_p2(party2, records, reader, writer, bloom_fp_rate=None, prefetch=4):
+    """在一条连接上以 P2 身份执行一次协议，返回 (交集和, 统计报告)"""
+    stats = TransferStats("P2")
+    channel = Channel(reader, writer, stats)
+    group, public_key = party2.group, party2.public_key
+    width = _ciphertext_width(public_key)
+    try:
+        hello = dict(group_params(group), paillier_n=hex(public_key.n), batch_size=party2.batch_size)
+        await channel.send(HELLO, json.dumps(hello).encode())
+
+        # 与第一轮并行，后台先加密盲化自己的记录，最多预先算好 prefetch 批
+        prepared = Stage(lambda: party2.encrypt_records(records), maxsize=prefetch)
+
+        async def blinded():
+            while True:
+                kind, payload = await channel.expect(BLINDED, BLINDED_END)
+                if kind == BLINDED_END:
+                    return
+                batch = _unpack_elements(group, payload)
+                stats.mark("round1_blind", len(batch), len(payload))
+                yield batch
+
+        if bloom_fp_rate is None:
+            async for z in Stage(party2.reblind, blinded(), prefetch):
+                payload = _pack_elements(group, z)
+                await channel.send(Z, payload)
+                stats.mark("round2_z", len(z), len(payload))
+            await channel.send(Z_END)
+        else:
+            async for bloom in Stage(lambda src: [party2.reblind_filter(src, bloom_fp_rate)], blinded(), prefetch):
+                payload = bloom.to_bytes()
+                await channel.send(Z_FILTER, payload)
+                stats.mark("round2_z", len(bloom), len(payload))
+
+        async for batch in prepared:
+            payload = _pack_records(group, batch, width)
+            await channel.send(RECORDS, payload)
+            stats.mark("round2_records", len(batch), len(payload))
+        await channel.send(RECORDS_END)
+
+        _, payload = await channel.expect(SUM)
+        stats.mark("round3_sum", 1, len(payload))
+        total = _unpack_ciphertext(public_key, payload, width)
+        result = await asyncio.get_running_loop().run_in_executor(None, party2.decrypt, total)
+        await channel.send(RESULT, json.dumps({"sum": result}).encode())
+        stats.mark("round3_sum")
+    finally:
+        await channel.close()
+    return result, stats.report()
+
+
+async def run_p1(identifiers, reader, writer, workers=1, prefetch=4):
+    """在一条连接上以 P1 身份执行一次协议，返回 (交集大小, 交集和, 统计报告)"""
+    stats = TransferStats("P1")
+    channel = Channel(reader, writer, stats)
+    try:
+        _, payload = await channel.expect(HELLO)
+        hello = json.loads(payload)
+        group = group_from_params(hello)
+        public_key = paillier.PaillierPublicKey(int(hello["paillier_n"], 16))
+        width = _ciphertext_width(public_key)
+        party1 = PSISumParty1(group, public_key, batch_size=hello["batch_size"], workers=workers)
+
+        async def send_blinded():
+            async for batch in Stage(lambda: party1.blind(identifiers), maxsize=prefetch):
+                payload = _pack_elements(group, batch)
+                await channel.send(BLINDED, payload)
+                stats.mark("round1_blind", len(batch), len(payload))
+            await channel.send(BLINDED_END)
+
+        async def receive_z():
+            while True:
+                kind, payload = await channel.expect(Z, Z_END, Z_FILTER)
+                if kind == Z_END:
+                    return
+                if kind == Z_FILTER:
+                    party1.receive_z_filter(payload)
+                    stats.mark("round2_z", len(party1.z_filter), len(payload))
+                    return
+                batch = _unpack_elements(group, payload)
+                party1.z_set.update(batch)
+                stats.mark("round2_z", len(batch), len(payload))
+
+        # Z 边发边收：P2 处理完前几批就开始回传
+        await asyncio.gather(send_blinded(), receive_z())
+
+        async def records():
+            while True:
+                kind, payload = await channel.expect(RECORDS, RECORDS_END)
+                if kind == RECORDS_END:
+                    return
+                batch = _unpack_records(group, public_key, payload, width)
+                stats.mark("round2_records", len(batch), len(payload))
+                yield batch
+
+        async for total in Stage(lambda src: [party1.intersect_sum(src)], records(), prefetch):
+            payload = _pack_ciphertext(total, width, be_secure=True)
+        await channel.send(SUM, payload)
+        stats.mark("round3_sum", 1, len(payload))
+        _, payload = await channel.expect(RESULT)
+        stats.mark("round3_sum")
+        result = json.loads(payload)["sum"]
+    finally:
+        await channel.close()
+    return party1.intersection_size, result, stats.report()
+
+
+def _make_party2(group, batch_size, workers, precompute=0, keypair=None, pool=None):
+    party2 = PSISumParty2(as_group(group), keypair=keypair, batch_size=batch_size, workers=workers,
+                          randomness_pool=pool)
+    if precompute:
+        party2.randomness_pool = PaillierRandomnessPool(party2.public_key).fill(precompute, workers)
+    return party2
+
+
+async def run_local(identifiers, records, group="modp", transport="tcp", batch_size=DEFAULT_BATCH_SIZE,
+                    workers=1, precompute=0, bloom_fp_rate=None, prefetch=4, keypair=None):
+    """P1、P2 位于同一事件循环中一条真实套接字的两端，返回包含双方报告的字典"""
+    party2 = _make_party2(group, batch_size, workers, precompute, keypair)
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    async def handle(reader, writer):
+        try:
+            done.set_result(await serve_p2(party2, records, reader, writer, bloom_fp_rate, prefetch))
+        except Exception as exc:
+            done.set_exception(exc)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if transport == "unix":
+            path = os.path.join(tmp, "psi.sock")
+            server = await asyncio.start_unix_server(handle, path)
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        async with server:
+            size, total, p1_report = await run_p1(identifiers, reader, writer, workers, prefetch)
+            _, p2_report = await done
+    return {"group": party2.group.name, "transport": transport, "batch_size": batch_size,
+            "intersection_size": size, "intersection_sum": total, "P1": p1_report, "P2": p2_report}
+
+
+def _parse_address(address):
+    """"host:port" 或 "unix:/path/to.sock" """
+    if address.startswith("unix:"):
+        return "unix", address[5:]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+async def serve(address, records_factory, party2_factory, sessions=1, bloom_fp_rate=None, prefetch=4):
+    """监听 address，依次为 sessions 个连接执行协议（每个会话使用新的盲化私钥），返回各会话报告"""
+    kind, target = _parse_address(address)
+    reports = []
+    finished = asyncio.Event()
+
+    async def handle(reader, writer):
+        try:
+            result, report = await serve_p2(party2_factory(), records_factory(), reader, writer,
+                                            bloom_fp_rate, prefetch)
+            reports.append(dict(report, intersection_sum=result))
+        except Exception as exc:
+            reports.append({"role": "P2", "error": repr(exc)})
+        if len(reports) >= sessions:
+            finished.set()
+
+    if kind == "unix":
+        server = await asyncio.start_unix_server(handle, target)
+    else:
+        server = await asyncio.start_server(handle, *target)
+    async with server:
+        print(f"P2 listening on {address}", flush=True)
+        await finished.wait()
+    return reports
+
+
+async def connect(address, identifiers, workers=1, prefetch=4):
+    kind, target = _parse_address(address)
+    if kind == "unix":
+        reader, writer = await asyncio.open_unix_connection(target)
+    else:
+        reader, writer = await asyncio.open_connection(*target)
+    size, total, report = await run_p1(identifiers, reader, writer, workers, prefetch)
+    return dict(report, intersection_size=size, intersection_sum=total)
+
+
+def _write_report(report, path):
+    if path == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif path:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PSI-Sum over TCP/Unix sockets")
+    sub = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--workers", type=int, default=1)
+    common.add_argument("--prefetch", type=int, default=4, help="每个流水线阶段最多缓冲的批数")
+    common.add_argument("--report", metavar="PATH", help="将统计报告写入 JSON 文件，'-' 为标准输出")
+    p2_opts = argparse.ArgumentParser(add_help=False)
+    p2_opts.add_argument("--p2", metavar="FILE", help="P2 的记录文件，每行 \"标识符,次数\"")
+    p2_opts.add_argument("--group", choices=sorted(GROUPS), default="modp")
+    p2_opts.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    p2_opts.add_argument("--precompute", type=int, default=0, metavar="N")
+    p2_opts.add_argument("--bloom-fpr", type=float, metavar="RATE")
+
+    local = sub.add_parser("local", parents=[common, p2_opts], help="双方在本机套接字两端运行")
+    local.add_argument("--p1", metavar="FILE", help="P1 的标识符文件，每行一个")
+    local.add_argument("--transport", choices=["tcp", "unix"], default="tcp")
+    server = sub.add_parser("serve", parents=[common, p2_opts], help="以 P2 身份监听")
+    server.add_argument("--listen", required=True, metavar="HOST:PORT|unix:PATH")
+    server.add_argument("--sessions", type=int, default=1)
+    server.add_argument("--store", metavar="DIR", help="从 store.py 建立的盲化记录库提供记录（忽略 --p2/--group）")
+    client = sub.add_parser("connect", parents=[common], help="以 P1 身份连接")
+    client.add_argument("--connect", required=True, metavar="HOST:PORT|unix:PATH")
+    client.add_argument("--p1", metavar="FILE")
+    args = parser.parse_args(argv)
+
+    def identifiers():
+        return read_identifiers(args.p1) if args.p1 else ["password1", "password2", "user123"]
+
+    def records():
+        return read_records(args.p2) if args.p2 else [("password1", 100), ("password3", 50), ("user123", 200)]
+
+    if args.command == "local":
+        report = asyncio.run(run_local(identifiers(), records(), args.group, args.transport, args.batch_size,
+                                       args.workers, args.precompute, args.bloom_fpr, args.prefetch))
+        print(f"Intersection size: {report['intersection_size']}")
+        print(f"Intersection sum: {report['intersection_sum']}")
+        for role in ("P1", "P2"):
+            r = report[role]
+            print(f"{role}: sent {r['bytes_sent']} B, received {r['bytes_received']} B, wall {r['wall_s']:.3f} s")
+    elif args.command == "serve" and args.store:
+        # 记录直接取自库，使用库的群、长期盲化私钥和 Paillier 密钥对
+        store = BlindedStore(args.store)
+        report = asyncio.run(serve(args.listen, lambda: None,
+                                   lambda: PSISumParty2(store.group, keypair=store.keypair, batch_size=args.batch_size,
+                                                        workers=args.workers, store=store),
+                                   args.sessions, args.bloom_fpr, args.prefetch))
+    elif args.command == "serve":
+        # 所有会话共用 Paillier 密钥对和离线随机数池，盲化私钥每个会话重新选取
+        keypair = paillier.generate_paillier_keypair()
+        pool = PaillierRandomnessPool(keypair[0]).fill(args.precompute, args.workers) if args.precompute else None
+        report = asyncio.run(serve(args.listen, records,
+                                   lambda: _make_party2(args.group, args.batch_size, args.workers, keypair=keypair,
+                                                        pool=pool),
+                                   args.sessions, args.bloom_fpr, args.prefetch))
+    else:
+        report = asyncio.run(connect(args.connect, identifiers(), args.workers, args.prefetch))
+        print(f"Intersection size: {report['intersection_size']}")
+        print(f"Intersection sum: {report['intersection_sum']}")
+    _write_report(report, args.report)
+
+
+if __name__ == "__main__":
+    main()